@@ -0,0 +1,33 @@
+import uuid
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .models import CustomUser
+from .revocation import revocation_list
+from .routers import set_client
+from .tokens import EMAIL_CLAIM
+
+
+#JWT authentication without the per-request user SELECT
+class TokenUserAuthentication(JWTAuthentication):
+    # request.user is built from the token's userId/email claims. The remaining
+    # fields are deferred, so the user row is only loaded if a view reads them.
+    # Revocation is checked against the in-memory revocation list.
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if revocation_list.is_revoked(validated_token.get(api_settings.JTI_CLAIM, "")):
+            raise InvalidToken(_("Token has been revoked"))
+        return validated_token
+
+    def get_user(self, validated_token):
+        try:
+            userId = uuid.UUID(str(validated_token[api_settings.USER_ID_CLAIM]))
+        except (KeyError, ValueError):
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        set_client(userId)
+        email = validated_token.get(EMAIL_CLAIM)
+        if email is None:
+            return CustomUser.from_db(None, ["userId"], [userId])
+        return CustomUser.from_db(None, ["userId", "email"], [userId, email])
@@ -0,0 +1,166 @@
+import csv
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import django
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from .cache import user_cache
+from .models import CustomUser, Organisation, Membership
+from .search import organisation_search
+from .validation import reg_form_error
+
+IMPORT_FIELDS = ("firstName", "lastName", "email", "password", "phone")
+# Checked against their column's max_length. Not the password: its column holds
+# the hash, and /auth/register puts no limit on the plaintext
+LENGTH_CHECKED_FIELDS = ("firstName", "lastName", "email", "phone")
+
+
+#----------------------------Parsing--------------------------------------------------
+def parse_rows(text, format="ndjson"):
+    # Yields (row number, row dict or None); None marks a line that could not be parsed.
+    # text is a string or an iterable of lines, so uploads can be read line by line
+    lines = text.splitlines() if isinstance(text, str) else text
+    if format == "csv":
+        for number, row in enumerate(csv.DictReader(lines), start=1):
+            yield number, row
+        return
+
+    number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def row_error(row) -> dict:
+    if row is None:
+        return {"field": None, "message": "Invalid Row"}
+    error = reg_form_error(**{field: row.get(field) for field in IMPORT_FIELDS})
+    if error is not None:
+        return error
+    for field in LENGTH_CHECKED_FIELDS:
+        value = row.get(field)
+        max_length = CustomUser._meta.get_field(field).max_length
+        if value is not None and (not isinstance(value, str) or len(value) > max_length):
+            return {"field": field, "message": "Invalid Input"}
+    return None
+
+
+#----------------------------Import---------------------------------------------------
+# Hashing processes are started once per worker count and shared by every
+# import in this process, instead of forking a new pool per request
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def hashing_executor(workers):
+    if workers <= 1:
+        return None
+    with _executors_lock:
+        if workers not in _executors:
+            _executors[workers] = ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+        return _executors[workers]
+
+
+def import_users(rows, workers=1, chunk_size=1000) -> dict:
+    # Hashes passwords on a process pool and writes users, their default
+    # organisations and owner memberships with one bulk INSERT per table per chunk.
+    # Invalid rows are reported and skipped; they never abort the batch.
+    result = {"created": 0, "errors": []}
+    seen_emails = set()
+    executor = hashing_executor(workers)
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        valid = []
+        for number, row in chunk:
+            error = row_error(row)
+            if error is None and str(row["email"]).lower() in seen_emails:
+                error = {"field": "email", "message": "Already Exists"}
+            if error is not None:
+                result["errors"].append({"row": number, **error})
+                continue
+            seen_emails.add(str(row["email"]).lower())
+            valid.append((number, row))
+        result["created"] += _import_chunk(valid, executor, result["errors"])
+    result["errors"].sort(key=lambda error: error["row"])
+    return result
+
+
+def _import_chunk(valid, executor, errors) -> int:
+    passwords = [row["password"] for _, row in valid]
+    if executor is not None:
+        hashed = list(executor.map(make_password, passwords, chunksize=max(len(passwords) // 64, 1)))
+    else:
+        hashed = [make_password(password) for password in passwords]
+    pending = [(number, row, password) for (number, row), password in zip(valid, hashed)]
+
+    # A concurrent registration can claim an email between the check and the
+    # INSERT; re-check once and drop the conflicting rows.
+    for _ in range(2):
+        existing = {
+            email.lower()
+            for email in CustomUser.objects.filter(email__lower__in=[str(row["email"]).lower() for _, row, _ in pending]).values_list("email", flat=True)
+        }
+        for number, row, _ in pending:
+            if str(row["email"]).lower() in existing:
+                errors.append({"row": number, "field": "email", "message": "Already Exists"})
+        pending = [item for item in pending if str(item[1]["email"]).lower() not in existing]
+        try:
+            _bulk_insert(pending)
+            return len(pending)
+        except IntegrityError:
+            pass
+
+    # Still conflicting: insert row by row so only the offending rows fail
+    created = 0
+    for item in pending:
+        try:
+            _bulk_insert([item])
+            created += 1
+        except IntegrityError:
+            errors.append({"row": item[0], "field": "email", "message": "Already Exists"})
+    return created
+
+
+def _bulk_insert(pending):
+    users = [
+        CustomUser(
+            firstName=row["firstName"],
+            lastName=row["lastName"],
+            email=row["email"],
+            phone=row.get("phone") or None,
+            password=password,
+        )
+        for _, row, password in pending
+    ]
+    organisations = [
+        Organisation(
+            owner=user,
+            name=f"{user.firstName}'s Organisation",
+            description=f"An Organisation created by {user.lastName} {user.firstName}",
+        )
+        for user in users
+    ]
+    memberships = [
+        Membership(user=user, organisation=org, role=Membership.OWNER)
+        for user, org in zip(users, organisations)
+    ]
+    with transaction.atomic():
+        CustomUser.objects.bulk_create(users)
+        Organisation.objects.bulk_create(organisations)
+        Membership.objects.bulk_create(memberships)
+        # No post_save here either, so index the organisations for search directly
+        organisation_search.index(organisations, created=True)
+    # bulk_create skips post_save, so clear cached "not found" entries here
+    for user in users:
+        user_cache.invalidate(user)
@@ -0,0 +1,116 @@
+import uuid
+from collections import Counter
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from .models import CustomUser
+
+# Cache backends are instantiated per thread, so eviction counts live at module level
+_evictions = Counter()
+
+
+#Locmem backend (LRU + TTL) that counts the entries it evicts
+class CountingLocMemCache(LocMemCache):
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self._name = name
+
+    def _cull(self):
+        size = len(self._cache)
+        super()._cull()
+        _evictions[self._name] += size - len(self._cache)
+
+    @property
+    def evictions(self) -> int:
+        return _evictions[self._name]
+
+
+#Cache of user projections (never the password hash) keyed by userId
+class UserCache:
+    # Response fields plus updatedAt, the validator for conditional GETs
+    # Misses are not cached: another worker may register the user at any moment
+    FIELDS = ("userId", "firstName", "lastName", "email", "phone", "updatedAt")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[settings.USER_CACHE_ALIAS]
+
+    def get_by_id(self, userId) -> dict | None:
+        try:
+            userId = uuid.UUID(str(userId))
+        except ValueError:
+            return None
+
+        projection = self.cache.get(self._id_key(userId))
+        if projection is not None:
+            self.hits += 1
+            return projection
+
+        self.misses += 1
+        projection = CustomUser.objects.filter(userId=userId).values(*self.FIELDS).first()
+        if projection is not None:
+            self.store(projection)
+        return projection
+
+    def invalidate(self, user):
+        self.cache.delete(self._id_key(user.pk))
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": getattr(self.cache, "evictions", None),
+        }
+
+    def store(self, projection):
+        self.cache.set(self._id_key(projection["userId"]), projection)
+
+    def _id_key(self, userId):
+        return f"user:id:{uuid.UUID(str(userId)).hex}"
+
+
+user_cache = UserCache()
+
+
+#Short-lived cache of "viewer can see target" decisions for get_user
+class VisibilityCache:
+    # Each user has a generation token; a decision is stored under both users'
+    # tokens, so deleting either token (on a membership change) orphans it.
+    @property
+    def cache(self):
+        return caches[settings.USER_CACHE_ALIAS]
+
+    @property
+    def enabled(self) -> bool:
+        return settings.VISIBILITY_CACHE_TIMEOUT > 0
+
+    def get(self, viewerId, targetId) -> bool | None:
+        key = self._decision_key(viewerId, targetId)
+        return None if key is None else self.cache.get(key)
+
+    def set(self, viewerId, targetId, visible):
+        self.cache.add(self._generation_key(viewerId), uuid.uuid4().hex, None)
+        self.cache.add(self._generation_key(targetId), uuid.uuid4().hex, None)
+        key = self._decision_key(viewerId, targetId)
+        if key is not None:
+            self.cache.set(key, visible, settings.VISIBILITY_CACHE_TIMEOUT)
+
+    def invalidate_users(self, userIds):
+        self.cache.delete_many([self._generation_key(userId) for userId in userIds])
+
+    def _decision_key(self, viewerId, targetId):
+        viewer_key, target_key = self._generation_key(viewerId), self._generation_key(targetId)
+        generations = self.cache.get_many([viewer_key, target_key])
+        if viewer_key not in generations or target_key not in generations:
+            return None
+        return f"visible:{generations[viewer_key]}:{generations[target_key]}"
+
+    def _generation_key(self, userId):
+        return f"visible:generation:{uuid.UUID(str(userId)).hex}"
+
+
+visibility_cache = VisibilityCache()
@@ -0,0 +1,35 @@
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.base import IsolationLevel
+from api.db.pool import ConnectionPool, get_pool, ping, pools
+
+
+#Postgres backend that borrows connections from a process-wide pool
+class DatabaseWrapper(base.DatabaseWrapper):
+    # Configured by DATABASES[alias]["POOL"] (min_size, max_size, timeout,
+    # idle_timeout, check). Keep CONN_MAX_AGE at 0: Django then "closes" the
+    # connection at the end of every request, which hands it back to the pool.
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict["OPTIONS"]
+        self.isolation_level = IsolationLevel(options.get("isolation_level", IsolationLevel.READ_COMMITTED))
+        pool = get_pool(self.alias, lambda: self._create_pool(conn_params))
+        return pool.acquire()
+
+    def _create_pool(self, conn_params):
+        options = dict(self.settings_dict.get("POOL", {}))
+        check = ping if options.pop("check", True) else None
+        connect = lambda: super(DatabaseWrapper, self).get_new_connection(conn_params)
+        pool = ConnectionPool(connect, check=check, **options)
+        pool.prefill()
+        return pool
+
+    def _close(self):
+        if self.connection is None:
+            return
+        broken = False
+        try:
+            # Never hand back a connection with an open or failed transaction
+            if self.connection.info.transaction_status != 0:
+                self.connection.rollback()
+        except self.Database.Error:
+            broken = True
+        pools[self.alias].release(self.connection, broken=broken)
@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+#Thread-safe pool of DB-API connections
+class ConnectionPool:
+    # Connections are handed out most-recently-used first, so under light load
+    # the same few stay warm and the rest age out after idle_timeout (never
+    # below min_size). Every checkout runs `check`, and a connection that fails
+    # it is replaced. Callers beyond max_size wait up to `timeout` seconds.
+    # Django keeps one connection per thread, and under ASGI the ORM runs on
+    # sync worker threads, so one lock covers both servers.
+    def __init__(self, connect, min_size=0, max_size=10, timeout=5.0, idle_timeout=300.0, check=None):
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.check = check
+        self._idle = deque()
+        self._condition = threading.Condition()
+        self._pid = os.getpid()
+        self.size = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.failed_checks = 0
+        self.created = 0
+        self.closed = 0
+
+    def acquire(self):
+        self._after_fork()
+        start = time.perf_counter()
+        connection = self._checkout(start)
+        while connection is not None and not self._healthy(connection):
+            self._discard(connection)
+            connection = self._checkout(start)
+        if connection is None:
+            # A slot was reserved for a new connection
+            try:
+                connection = self.connect()
+            except Exception:
+                with self._condition:
+                    self.size -= 1
+                    self._condition.notify()
+                raise
+            with self._condition:
+                self.created += 1
+        return connection
+
+    def release(self, connection, broken=False):
+        if os.getpid() != self._pid:
+            # Inherited from the parent process; it owns the socket
+            return
+        if broken:
+            self._discard(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def prefill(self):
+        while self.size < self.min_size:
+            with self._condition:
+                if self.size >= self.min_size:
+                    return
+                self.size += 1
+            connection = self.connect()
+            with self._condition:
+                self.created += 1
+            self.release(connection)
+
+    def close(self):
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+            self.size -= len(idle)
+            self.closed += len(idle)
+        for connection, _ in idle:
+            self._close(connection)
+
+    def stats(self) -> dict:
+        with self._condition:
+            idle = len(self._idle)
+            return {
+                "size": self.size,
+                "idle": idle,
+                "in_use": self.size - idle,
+                "max_size": self.max_size,
+                "saturation": (self.size - idle) / self.max_size if self.max_size else 0.0,
+                "waiting": self.waiting,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds": self.wait_seconds,
+                "max_wait_seconds": self.max_wait_seconds,
+                "failed_checks": self.failed_checks,
+                "created": self.created,
+                "closed": self.closed,
+            }
+
+    #---------------------------Internals-------------------------------------------
+    def _checkout(self, start):
+        # Returns an idle connection, or None after reserving a slot for a new one
+        expired = []
+        try:
+            with self._condition:
+                deadline = start + self.timeout
+                while True:
+                    expired += self._expire_idle()
+                    if self._idle:
+                        connection, _ = self._idle.pop()
+                        self._record_wait(start)
+                        return connection
+                    if self.size < self.max_size:
+                        self.size += 1
+                        self._record_wait(start)
+                        return None
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f"No connection available within {self.timeout}s (max_size={self.max_size})")
+                    self.waiting += 1
+                    try:
+                        self._condition.wait(remaining)
+                    finally:
+                        self.waiting -= 1
+        finally:
+            for connection in expired:
+                self._close(connection)
+
+    def _expire_idle(self) -> list:
+        # Oldest idle connections sit at the left; keep at least min_size open
+        expired = []
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._idle and self._idle[0][1] < cutoff and self.size > self.min_size:
+            expired.append(self._idle.popleft()[0])
+            self.size -= 1
+            self.closed += 1
+        return expired
+
+    def _record_wait(self, start):
+        waited = time.perf_counter() - start
+        self.checkouts += 1
+        self.wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def _healthy(self, connection) -> bool:
+        if self.check is None:
+            return True
+        try:
+            healthy = self.check(connection)
+        except Exception:
+            healthy = False
+        if not healthy:
+            with self._condition:
+                self.failed_checks += 1
+        return healthy
+
+    def _discard(self, connection):
+        self._close(connection)
+        with self._condition:
+            self.size -= 1
+            self.closed += 1
+            self._condition.notify()
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _after_fork(self):
+        # Connections inherited from a parent process (e.g. a preloading server)
+        # must not be shared; forget them without closing the parent's sockets
+        if os.getpid() != self._pid:
+            with self._condition:
+                self._idle.clear()
+                self.size = 0
+                self._pid = os.getpid()
+
+
+def ping(connection) -> bool:
+    # Health check on checkout: a round trip proves the socket and session are alive.
+    # Prefilled connections are not in autocommit yet, so the SELECT opens a
+    # transaction; roll it back or Django can't switch autocommit on afterwards
+    if connection.closed:
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    if not connection.autocommit:
+        connection.rollback()
+    return True
+
+
+# Process-wide pools, keyed by database alias
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(alias, factory) -> ConnectionPool:
+    with pools_lock:
+        if alias not in pools:
+            pools[alias] = factory()
+        return pools[alias]
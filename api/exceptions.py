@@ -0,0 +1,16 @@
+from rest_framework.exceptions import Throttled
+from rest_framework.views import exception_handler as drf_exception_handler
+
+
+#DRF exception handler: throttled requests get the API's error envelope
+def exception_handler(exc, context):
+    # Everything else keeps DRF's default body. The Retry-After header DRF sets
+    # from the throttle's wait time is kept
+    response = drf_exception_handler(exc, context)
+    if isinstance(exc, Throttled) and response is not None:
+        response.data = {
+            "status": "Too Many Requests",
+            "message": "Too many attempts, try again later",
+            "statusCode": 429
+        }
+    return response
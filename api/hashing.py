@@ -0,0 +1,68 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+#Dedicated, size-limited executor for password hashing
+class HashingPool:
+    # Caps how many hashes run at once, whatever the number of request threads:
+    # PBKDF2 runs in hashlib with the GIL released, so every concurrent hash is
+    # a busy core. The calling request thread waits for its result. Shedding load
+    # is left to the credential views' ConcurrencyLimiter (api/throttling.py),
+    # which rejects requests before any database or hashing work; it also bounds
+    # how many jobs can be queued here.
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hashing")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.hash_seconds = 0.0
+        self.max_hash_seconds = 0.0
+
+    def submit(self, fn, *args):
+        with self._lock:
+            self.in_flight += 1
+        future = self._executor.submit(self._timed, fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def run(self, fn, *args):
+        return self.submit(fn, *args).result()
+
+    def make_password(self, password) -> str:
+        return self.run(hashers.make_password, password)
+
+    def check_password(self, password, encoded) -> bool:
+        return self.run(hashers.check_password, password, encoded)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "in_flight": self.in_flight,
+                "queue_depth": max(self.in_flight - self.workers, 0),
+                "completed": self.completed,
+                "hash_seconds": self.hash_seconds,
+                "max_hash_seconds": self.max_hash_seconds,
+            }
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.completed += 1
+                self.hash_seconds += elapsed
+                self.max_hash_seconds = max(self.max_hash_seconds, elapsed)
+
+    def _release(self, future):
+        with self._lock:
+            self.in_flight -= 1
+
+
+hashing_pool = HashingPool(settings.PASSWORD_HASHING_WORKERS)
@@ -0,0 +1,35 @@
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from api.bulk import import_users, parse_rows
+
+
+class Command(BaseCommand):
+    help = "Bulk-register users (and their default organisations) from an NDJSON or CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - to read from stdin")
+        parser.add_argument("--format", choices=["ndjson", "csv"], help="Defaults to the file extension, else ndjson")
+        parser.add_argument("--workers", type=int, default=settings.BULK_IMPORT_WORKERS, help="Password hashing processes")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per bulk INSERT")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        format = options["format"] or ("csv" if path.endswith(".csv") else "ndjson")
+        if path == "-":
+            result = self.import_file(sys.stdin, format, options)
+        else:
+            try:
+                # newline="" lets the csv module handle line endings inside quoted fields
+                file = open(path, encoding="utf-8", newline="")
+            except OSError as e:
+                raise CommandError(f"Cannot read {path}: {e}")
+            with file:
+                result = self.import_file(file, format, options)
+        for error in result["errors"]:
+            self.stderr.write(f"row {error['row']}: {error['field']} - {error['message']}")
+        self.stdout.write(self.style.SUCCESS(f"Imported {result['created']} users, {len(result['errors'])} rows rejected"))
+
+    def import_file(self, file, format, options) -> dict:
+        # Rows are parsed and imported a chunk at a time as the file is read
+        return import_users(parse_rows(file, format), workers=options["workers"], chunk_size=options["chunk_size"])
@@ -0,0 +1,240 @@
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Another worker's gauges are dropped once its file is this many flush intervals old
+STALE_FLUSH_INTERVALS = 5
+
+HELP = {
+    "http_requests_total": ("counter", "Requests by route, method and status code"),
+    "http_request_duration_seconds": ("histogram", "Request latency by route"),
+    "http_db_queries_total": ("counter", "SQL queries issued while serving requests"),
+    "http_db_seconds_total": ("counter", "Time spent in SQL while serving requests"),
+    "http_db_queries_per_request": ("histogram", "SQL queries per request"),
+    "admission_decisions_total": ("counter", "Credential endpoint admission decisions by limiter"),
+}
+
+
+#In-process metric aggregates
+class Registry:
+    # Counters and histograms keyed by (name, sorted label pairs). With
+    # METRICS_MULTIPROC_DIR set, every worker process periodically writes its
+    # snapshot to that directory and /metrics sums all of them.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+        self.last_flush = 0.0
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"buckets": list(buckets), "counts": [0] * (len(buckets) + 1), "sum": 0.0}
+            histogram["counts"][bisect_left(histogram["buckets"], value)] += 1
+            histogram["sum"] += value
+
+    def register_collector(self, collector):
+        # collector() returns [(name, help, labels, value)] samples, read at scrape time.
+        # Names ending in _total are running totals and exported as counters; the
+        # rest are point-in-time gauges
+        self.collectors.append(collector)
+
+    def snapshot(self) -> dict:
+        gauges = []
+        for collector in self.collectors:
+            for name, help, labels, value in collector():
+                gauges.append([name, help, {**labels, "pid": str(os.getpid())}, value])
+        with self.lock:
+            return {
+                "counters": [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                "histograms": [
+                    [name, dict(labels), {**histogram, "counts": list(histogram["counts"])}]
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+                "gauges": gauges,
+            }
+
+    #---------------------------Multi-process--------------------------------------
+    def maybe_flush(self):
+        directory = settings.METRICS_MULTIPROC_DIR
+        if not directory or time.monotonic() - self.last_flush < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.last_flush = time.monotonic()
+        self.flush(directory)
+
+    def flush(self, directory):
+        path = self._path(directory)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(f"{path}.tmp", path)
+
+    def remove(self, directory):
+        # At worker exit, so a recycled worker's numbers stop being exported
+        try:
+            os.remove(self._path(directory))
+        except FileNotFoundError:
+            pass
+
+    def collect(self) -> list:
+        directory = settings.METRICS_MULTIPROC_DIR
+        if not directory:
+            return [self.snapshot()]
+        own = self._path(directory)
+        # A worker that stopped flushing (idle, or killed before it could remove its
+        # file) keeps contributing its totals, but its gauges no longer describe anything
+        stale_before = time.time() - STALE_FLUSH_INTERVALS * settings.METRICS_FLUSH_INTERVAL
+        snapshots = [self.snapshot()]
+        for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+                if os.path.getmtime(path) < stale_before:
+                    snapshot["gauges"] = []
+            except (OSError, ValueError):
+                continue
+            snapshots.append(snapshot)
+        return snapshots
+
+    def _path(self, directory):
+        return os.path.join(directory, f"metrics-{os.getpid()}.json")
+
+    #---------------------------Exposition-----------------------------------------
+    def render(self) -> str:
+        counters, histograms, gauges = {}, {}, {}
+        for snapshot in self.collect():
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(sorted(labels.items())))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, histogram in snapshot["histograms"]:
+                key = (name, tuple(sorted(labels.items())))
+                merged = histograms.setdefault(key, {"buckets": histogram["buckets"], "counts": [0] * len(histogram["counts"]), "sum": 0.0})
+                merged["counts"] = [a + b for a, b in zip(merged["counts"], histogram["counts"])]
+                merged["sum"] += histogram["sum"]
+            for name, help, labels, value in snapshot["gauges"]:
+                gauges.setdefault(name, [help, []])[1].append((labels, value))
+
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines += self._header(name, *HELP.get(name, ("counter", name)))
+            lines += [f"{name}{_labels(dict(labels))} {_number(value)}" for (n, labels), value in sorted(counters.items()) if n == name]
+        for name in sorted({name for name, _ in histograms}):
+            lines += self._header(name, *HELP.get(name, ("histogram", name)))
+            for (n, labels), histogram in sorted(histograms.items()):
+                if n != name:
+                    continue
+                labels, cumulative = dict(labels), 0
+                for bound, count in zip(histogram["buckets"] + ["+Inf"], histogram["counts"]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels({**labels, 'le': str(bound)})} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(histogram['sum'])}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        for name, (help, samples) in sorted(gauges.items()):
+            lines += self._header(name, "counter" if name.endswith("_total") else "gauge", help)
+            lines += [f"{name}{_labels(labels)} {_number(value)}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+    def _header(self, name, type, help):
+        return [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+
+
+#Gauges and running totals from the caches and worker pools
+def _hashing_pool_gauges():
+    from .hashing import hashing_pool
+    stats = hashing_pool.stats()
+    return [
+        ("password_hashing_in_flight", "Hashing jobs running or queued", {}, stats["in_flight"]),
+        ("password_hashing_queue_depth", "Hashing jobs waiting for a worker", {}, stats["queue_depth"]),
+        ("password_hashing_completed_total", "Hashing jobs completed", {}, stats["completed"]),
+        ("password_hashing_seconds_total", "Total time spent hashing", {}, stats["hash_seconds"]),
+        ("password_hashing_max_seconds", "Slowest hashing job", {}, stats["max_hash_seconds"]),
+    ]
+
+
+def _credential_limiter_gauges():
+    from .throttling import credential_limiter
+    return [
+        ("credentials_in_flight", "Credential requests running", {}, credential_limiter.in_flight),
+        ("credentials_concurrency_limit", "Credential requests allowed to run at once", {}, credential_limiter.limit),
+    ]
+
+
+def _revocation_gauges():
+    from .revocation import revocation_list
+    stats = revocation_list.stats()
+    return [
+        ("revocation_filter_entries", "Revoked jtis in this worker's Bloom filter", {}, stats["entries"]),
+        ("revocation_filter_bytes", "Size of this worker's Bloom filter", {}, stats["bytes"]),
+        ("revocation_lookups_total", "Revocation checks", {}, stats["lookups"]),
+        ("revocation_false_positives_total", "Bloom filter hits not found in the table", {}, stats["false_positives"]),
+    ]
+
+
+def _user_cache_gauges():
+    from .cache import user_cache
+    stats = user_cache.stats()
+    gauges = [
+        ("user_cache_hits_total", "User projection cache hits", {}, stats["hits"]),
+        ("user_cache_misses_total", "User projection cache misses", {}, stats["misses"]),
+    ]
+    if stats["evictions"] is not None:
+        gauges.append(("user_cache_evictions_total", "User projection cache LRU evictions", {}, stats["evictions"]))
+    return gauges
+
+
+def _db_pool_gauges():
+    from .db.pool import pools
+    gauges = []
+    for alias, pool in list(pools.items()):
+        stats, labels = pool.stats(), {"alias": alias}
+        gauges += [
+            ("db_pool_size", "Open pooled connections", labels, stats["size"]),
+            ("db_pool_in_use", "Pooled connections checked out", labels, stats["in_use"]),
+            ("db_pool_saturation", "Share of max_size checked out", labels, stats["saturation"]),
+            ("db_pool_waiting", "Requests waiting for a connection", labels, stats["waiting"]),
+            ("db_pool_checkouts_total", "Connection checkouts", labels, stats["checkouts"]),
+            ("db_pool_timeouts_total", "Checkouts that timed out waiting", labels, stats["timeouts"]),
+            ("db_pool_wait_seconds_total", "Total time spent waiting for a connection", labels, stats["wait_seconds"]),
+            ("db_pool_max_wait_seconds", "Longest wait for a connection", labels, stats["max_wait_seconds"]),
+            ("db_pool_failed_checks_total", "Connections replaced after a failed health check", labels, stats["failed_checks"]),
+        ]
+    return gauges
+
+
+registry.register_collector(_hashing_pool_gauges)
+registry.register_collector(_user_cache_gauges)
+registry.register_collector(_db_pool_gauges)
+registry.register_collector(_credential_limiter_gauges)
+registry.register_collector(_revocation_gauges)
@@ -0,0 +1,208 @@
+import atexit
+import json
+import os
+import random
+import threading
+import time
+from contextlib import ExitStack
+from urllib.parse import parse_qsl, urlencode
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.crypto import salted_hmac
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from .metrics import QUERY_COUNT_BUCKETS, registry
+from .profiling import StackSampler, is_valid_trigger, profile_name
+from . import routers
+from .tokens import AccessToken
+
+REDACTED = "[REDACTED]"
+# Matched against lowercased keys: passwords, access/refresh tokens (simplejwt's
+# "access"/"refresh" included), and anything that looks like a secret or a header
+SENSITIVE_KEYS = ("password", "token", "access", "refresh", "secret", "key", "authorization", "cookie")
+
+
+def is_sensitive(key) -> bool:
+    return any(word in key.lower() for word in SENSITIVE_KEYS)
+
+
+def pseudonymize_email(value):
+    # Same address, same stand-in, so a capture's register and login still line up;
+    # keyed with SECRET_KEY so stand-ins can't be matched against a list of addresses
+    if isinstance(value, list):
+        return [pseudonymize_email(item) for item in value]
+    if not isinstance(value, str):
+        return value
+    digest = salted_hmac("api.middleware.capture", value.lower()).hexdigest()[:16]
+    return f"capture-{digest}@example.invalid"
+
+
+def sanitize(value):
+    # Replaces credentials and email addresses anywhere in a decoded JSON document
+    if isinstance(value, dict):
+        return {key: sanitize_item(key, item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [sanitize(item) for item in value]
+    return value
+
+
+def sanitize_item(key, value):
+    if is_sensitive(key):
+        return REDACTED
+    if "email" in key.lower():
+        return pseudonymize_email(value)
+    return sanitize(value)
+
+
+def sanitize_query(query) -> str:
+    pairs = parse_qsl(query, keep_blank_values=True)
+    return urlencode([(key, sanitize_item(key, value)) for key, value in pairs])
+
+
+def decode_json(content, content_type):
+    if not content or not content_type.startswith("application/json"):
+        return None
+    try:
+        return sanitize(json.loads(content))
+    except ValueError:
+        return None
+
+
+#-------------------------Traffic capture---------------------------------------------
+class TrafficCaptureMiddleware:
+    # Appends sampled, sanitized request/response pairs with timings to the JSONL
+    # file named by TRAFFIC_CAPTURE_PATH, for benchmarks/replay.py. Bodies that
+    # are not JSON (e.g. CSV imports) are never written, as they may hold passwords.
+    # Headers are not written either; the bearer token is reduced to its userId.
+    def __init__(self, get_response):
+        if not settings.TRAFFIC_CAPTURE_PATH:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.path = settings.TRAFFIC_CAPTURE_PATH
+        self.sample_rate = settings.TRAFFIC_CAPTURE_SAMPLE_RATE
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        body = request.body if request.content_type.startswith("application/json") else None
+        timestamp = time.time()
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        record = {
+            "ts": timestamp,
+            "method": request.method,
+            "path": request.path,
+            "query": sanitize_query(request.META.get("QUERY_STRING", "")),
+            "contentType": request.content_type,
+            "body": decode_json(body, request.content_type),
+            "userId": self.user_id(request),
+            "status": response.status_code,
+            "durationMs": round(duration * 1000, 3),
+            "response": decode_json(getattr(response, "content", b""), response.get("Content-Type", "")),
+        }
+        line = json.dumps(record, default=str) + "\n"
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+        return response
+
+    def user_id(self, request):
+        # The replay tool mints a fresh token for this user instead of storing the bearer token
+        parts = request.headers.get("Authorization", "").split()
+        if len(parts) != 2 or parts[0] not in api_settings.AUTH_HEADER_TYPES:
+            return None
+        try:
+            return AccessToken(parts[1]).get(api_settings.USER_ID_CLAIM)
+        except TokenError:
+            return None
+
+
+#-------------------------Metrics----------------------------------------------------
+class MetricsMiddleware:
+    # Records per-route request counts, latency, status codes, SQL query count
+    # and SQL time into api.metrics.registry, exposed at /metrics.
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if settings.METRICS_MULTIPROC_DIR:
+            atexit.register(registry.remove, settings.METRICS_MULTIPROC_DIR)
+
+    def __call__(self, request):
+        db = {"queries": 0, "seconds": 0.0}
+
+        def count_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                db["queries"] += 1
+                db["seconds"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        labels = {"route": f"/{match.route}" if match else "unmatched", "method": request.method}
+        registry.inc("http_requests_total", {**labels, "status": str(response.status_code)})
+        registry.observe("http_request_duration_seconds", labels, duration)
+        registry.inc("http_db_queries_total", labels, db["queries"])
+        registry.inc("http_db_seconds_total", labels, db["seconds"])
+        registry.observe("http_db_queries_per_request", labels, db["queries"], buckets=QUERY_COUNT_BUCKETS)
+        registry.maybe_flush()
+        return response
+
+
+#-------------------------Profiling--------------------------------------------------
+class ProfilingMiddleware:
+    # Samples the stack of a fraction of requests (PROFILING_SAMPLE_RATE), or of
+    # requests carrying a valid signed X-Profile header when
+    # PROFILING_HEADER_ENABLED is set, and writes .folded flamegraph stacks plus
+    # a per-category time summary to PROFILING_OUTPUT_DIR. Unloaded when both
+    # are off, so it costs nothing then.
+    def __init__(self, get_response):
+        if not settings.PROFILING_SAMPLE_RATE and not settings.PROFILING_HEADER_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        triggered = settings.PROFILING_HEADER_ENABLED and "X-Profile" in request.headers
+        if triggered:
+            triggered = is_valid_trigger(request.headers["X-Profile"], settings.PROFILING_TOKEN_MAX_AGE)
+        if not triggered and random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), settings.PROFILING_INTERVAL)
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        path = sampler.write(settings.PROFILING_OUTPUT_DIR, profile_name(request))
+        if triggered:
+            response["X-Profile"] = os.path.basename(path)
+        return response
+
+
+#-------------------------Replica routing--------------------------------------------
+class DatabaseRoutingMiddleware:
+    # Gives each request fresh api.routers state (who the client is, whether it
+    # has written), so nothing leaks between requests served by the same thread.
+    # Unloaded when no replicas are configured.
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = routers.begin_request()
+        try:
+            return self.get_response(request)
+        finally:
+            routers.end_request(token)
@@ -0,0 +1,65 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_memberships(apps, schema_editor):
+    Organisation = apps.get_model("api", "Organisation")
+    Membership = apps.get_model("api", "Membership")
+    Through = Organisation.members.through
+
+    memberships = [
+        Membership(user_id=owner_id, organisation_id=orgId, role="owner")
+        for orgId, owner_id in Organisation.objects.values_list("orgId", "owner_id").iterator()
+    ]
+    owners = {(m.user_id, m.organisation_id) for m in memberships}
+    for user_id, orgId in Through.objects.values_list("customuser_id", "organisation_id").iterator():
+        if (user_id, orgId) not in owners:
+            memberships.append(Membership(user_id=user_id, organisation_id=orgId, role="member"))
+    Membership.objects.bulk_create(memberships, batch_size=1000)
+
+
+def restore_members(apps, schema_editor):
+    Organisation = apps.get_model("api", "Organisation")
+    Membership = apps.get_model("api", "Membership")
+    Through = Organisation.members.through
+
+    Through.objects.bulk_create(
+        [
+            Through(customuser_id=user_id, organisation_id=orgId)
+            for user_id, orgId in Membership.objects.filter(role="member").values_list("user_id", "organisation_id").iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Membership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('owner', 'Owner'), ('member', 'Member')], default='member', max_length=10)),
+                ('organisation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='api.organisation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'organisation'), name='unique_membership')],
+            },
+        ),
+        migrations.RunPython(copy_memberships, restore_members),
+        migrations.RemoveField(
+            model_name='organisation',
+            name='members',
+        ),
+        migrations.AddField(
+            model_name='organisation',
+            name='members',
+            field=models.ManyToManyField(related_name='organisation_following', through='api.Membership', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_updatedat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jti', models.CharField(max_length=255, unique=True)),
+                ('expiresAt', models.DateTimeField(db_index=True)),
+                ('revokedAt', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:07
+
+import api.uuids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The key default is applied in Python, so only the migration state changes.
+    # Existing rows keep their version 4 keys: they are still valid UUIDs, and
+    # rewriting primary keys would invalidate every issued token and foreign key.
+    # Only rows created from here on get time-ordered keys.
+
+    dependencies = [
+        ('api', '0004_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='customuser',
+                    name='userId',
+                    field=models.UUIDField(default=api.uuids.uuid7, editable=False, primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name='organisation',
+                    name='orgId',
+                    field=models.UUIDField(default=api.uuids.uuid7, editable=False, primary_key=True, serialize=False),
+                ),
+            ],
+        ),
+    ]
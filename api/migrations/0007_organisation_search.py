@@ -0,0 +1,47 @@
+# Generated by Django 5.0.14 on 2026-10-18 13:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_search_terms(apps, schema_editor):
+    # Postgres searches with its own GIN indexes (0008); everywhere else, build
+    # the inverted index for existing organisations
+    if schema_editor.connection.vendor == "postgresql":
+        return
+    from api.search import index_terms
+    Organisation = apps.get_model("api", "Organisation")
+    OrganisationSearchTerm = apps.get_model("api", "OrganisationSearchTerm")
+    for organisation in Organisation.objects.only("name", "description").iterator(chunk_size=2000):
+        OrganisationSearchTerm.objects.bulk_create([
+            OrganisationSearchTerm(organisation=organisation, term=term, weight=weight)
+            for term, weight in index_terms(organisation.name, organisation.description).items()
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_email_ci_membership_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganisationSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField()),
+                ('organisation', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='api.organisation')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='organisationsearchterm',
+            index=models.Index(fields=['organisation', 'term', 'weight'], name='search_term_org_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='organisationsearchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'organisation'), name='unique_search_term'),
+        ),
+        migrations.RunPython(populate_search_terms, migrations.RunPython.noop),
+    ]
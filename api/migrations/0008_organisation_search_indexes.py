@@ -0,0 +1,49 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:06
+
+from django.db import migrations
+
+# Postgres searches with its own GIN indexes; the expressions must match the
+# ones api.search.PostgresSearch filters on, or the planner won't use them
+POSTGRES_INDEXES = [
+    (
+        "organisation_search_vector_idx",
+        "USING gin (to_tsvector('simple'::regconfig, COALESCE(name, '') || ' ' || COALESCE(description, '')))",
+    ),
+    ("organisation_name_trgm_idx", "USING gin (name gin_trgm_ops)"),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    # CONCURRENTLY keeps api_organisation writable while the indexes build
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, definition in POSTGRES_INDEXES:
+        # A failed concurrent build leaves an invalid index behind, which
+        # IF NOT EXISTS would keep; drop it so a rerun builds it again
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", [name])
+            row = cursor.fetchone()
+        if row is not None and not row[0]:
+            schema_editor.execute(f"DROP INDEX CONCURRENTLY {name}")
+        schema_editor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON api_organisation {definition}")
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        for name, _ in POSTGRES_INDEXES:
+            schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction. This migration
+    # holds nothing else, so a failed build leaves no half-applied schema
+    atomic = False
+
+    dependencies = [
+        ('api', '0007_organisation_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -1,8 +1,13 @@
 from typing import Any
-import uuid
-from django.db import models
+from .uuids import uuid7
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 
+# Case-insensitive email lookups: email__lower=<lowercased> compiles to LOWER("email"),
+# the expression behind the unique_user_email_ci index
+models.EmailField.register_lookup(Lower)
+
 #Custom user manager
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -14,21 +19,34 @@ class CustomUserManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+    def visible_to(self, viewer, userId):
+        # Profile lookup and visibility check (same user, or shares an organisation) in one query
+        shared = Membership.objects.filter(user=models.OuterRef("userId"), organisation__memberships__user=viewer)
+        return self.filter(models.Q(userId=viewer.pk) | models.Exists(shared), userId=userId)
+
 
 
 #User Autentication Model
 class CustomUser(AbstractBaseUser):
-    userId = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    userId = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     firstName = models.CharField(max_length=30, blank=False)
     lastName = models.CharField(max_length=30, blank=False)
-    email = models.EmailField(unique=True, blank=False)
+    # Stored as given; unique regardless of case (see Meta)
+    email = models.EmailField(blank=False)
     phone = models.CharField(max_length=20, blank=True, null=True)
+    # Validator for conditional GETs (ETag / Last-Modified) on the user's profile
+    updatedAt = models.DateTimeField(auto_now=True)
     
     objects = CustomUserManager()
 
     USERNAME_FIELD = 'userId'
     REQUIRED_FIELDS = []
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(Lower("email"), name="unique_user_email_ci"),
+        ]
+
     #Setup initialization for default organisation creation during user registration
     # def save(self, *args, **kwargs):
     #     if not self.pk:  # Check if instance is being created
@@ -45,7 +63,103 @@ class CustomUser(AbstractBaseUser):
 #Organisation Models
 class Organisation(models.Model):
     owner = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="my_organisations")
-    orgId = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    orgId = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     name = models.CharField(max_length=100)
     description = models.TextField()
-    members= models.ManyToManyField(CustomUser, related_name="organisation_following")
+    updatedAt = models.DateTimeField(auto_now=True)
+    members= models.ManyToManyField(CustomUser, through="Membership", related_name="organisation_following")
+
+    #Keep the membership index in sync: the owner is always a member with the owner role
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            Membership.objects.create(user_id=self.owner_id, organisation=self, role=Membership.OWNER)
+
+
+#Membership manager
+class MembershipManager(models.Manager):
+    def organisations_for(self, user):
+        # One indexed lookup on (user, organisation), no OR and no DISTINCT needed
+        return Organisation.objects.filter(memberships__user=user)
+
+    def add_members(self, organisation_id, user_ids) -> set:
+        # One SELECT for existing rows and one multi-row INSERT; returns the ids this call
+        # inserted. If another request adds one of them in between, the INSERT hits the
+        # unique constraint and the rows are inserted one by one instead, so nothing
+        # added elsewhere is reported as added here
+        existing = self.member_ids(organisation_id, user_ids)
+        pending = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in existing]
+        if not pending:
+            return set()
+        try:
+            with transaction.atomic():
+                self.bulk_create([self.model(user_id=user_id, organisation_id=organisation_id) for user_id in pending])
+            return set(pending)
+        except IntegrityError:
+            pass
+        added = set()
+        for user_id in pending:
+            try:
+                with transaction.atomic():
+                    self.create(user_id=user_id, organisation_id=organisation_id)
+            except IntegrityError:
+                continue
+            added.add(user_id)
+        return added
+
+    def member_ids(self, organisation_id, user_ids) -> set:
+        return set(self.filter(organisation_id=organisation_id, user_id__in=user_ids).values_list("user_id", flat=True))
+
+
+#Membership Model: single relation for owners and members of an organisation
+class Membership(models.Model):
+    OWNER = "owner"
+    MEMBER = "member"
+    ROLE_CHOICES = [(OWNER, "Owner"), (MEMBER, "Member")]
+
+    # Both directions are served by composite indexes, whose leading column makes
+    # the single-column foreign key indexes redundant: (user, organisation) for a
+    # user's organisations and (organisation, user) for an organisation's members
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="memberships", db_index=False)
+    organisation = models.ForeignKey(Organisation, on_delete=models.CASCADE, related_name="memberships", db_index=False)
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES, default=MEMBER)
+
+    objects = MembershipManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "organisation"], name="unique_membership"),
+        ]
+        indexes = [
+            models.Index(fields=["organisation", "user"], name="membership_org_user_idx"),
+        ]
+
+
+#Revoked JWTs, by jti; rows can be deleted once the token has expired anyway
+class RevokedToken(models.Model):
+    jti = models.CharField(max_length=255, unique=True)
+    expiresAt = models.DateTimeField(db_index=True)
+    revokedAt = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+#Inverted index over organisation names and descriptions, for databases
+#without full-text search; see api/search.py
+class OrganisationSearchTerm(models.Model):
+    NAME = 2
+    DESCRIPTION = 1
+
+    organisation = models.ForeignKey(Organisation, on_delete=models.CASCADE, related_name="search_terms", db_index=False)
+    term = models.CharField(max_length=64)
+    # NAME | DESCRIPTION: where in the organisation the term occurs
+    weight = models.PositiveSmallIntegerField()
+
+    class Meta:
+        # (term, organisation) finds the organisations with a term; (organisation,
+        # term, weight) reads the terms of a caller's organisations from the index alone
+        constraints = [
+            models.UniqueConstraint(fields=["term", "organisation"], name="unique_search_term"),
+        ]
+        indexes = [
+            models.Index(fields=["organisation", "term", "weight"], name="search_term_org_idx"),
+        ]
@@ -0,0 +1,50 @@
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+#Keyset pagination for organisation listings
+class OrganisationCursorPagination(CursorPagination):
+    # orgId is the primary key, so every page is a range scan on an index
+    # starting from the opaque cursor position, whatever the page number.
+    ordering = "orgId"
+    page_size = 50
+    page_size_query_param = "limit"
+    max_page_size = 100
+
+    def get_paginated_response(self, data):
+        return Response({
+            "organisations": data,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+        })
+
+
+#Offset pagination for ranked search results
+class OrganisationSearchPagination(LimitOffsetPagination):
+    # Ranked results have no stable key to page on. Fetching one row past the
+    # page tells whether there is a next one, so no COUNT query is needed.
+    default_limit = 20
+    max_limit = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+        results = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(results) > self.limit
+        return results[:self.limit]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "organisations": data,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+        })
@@ -0,0 +1,10 @@
+import hmac
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+#Bulk imports are allowed only with the operator key from settings.BULK_IMPORT_KEY
+class HasImportKey(BasePermission):
+    def has_permission(self, request, view):
+        key = request.headers.get("X-Import-Key", "")
+        return bool(settings.BULK_IMPORT_KEY) and hmac.compare_digest(key, settings.BULK_IMPORT_KEY)
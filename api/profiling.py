@@ -0,0 +1,109 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.core import signing
+
+SIGNING_SALT = "api.profiling"
+
+# Checked innermost frame first; the first match decides where a sample's time goes
+CATEGORIES = (
+    ("password_hashing", ("django/contrib/auth/hashers.py", "api/hashing.py")),
+    ("jwt", ("rest_framework_simplejwt/", "/jwt/")),
+    ("rendering", ("rest_framework/renderers.py", "api/renderers.py", "json/encoder.py")),
+    ("orm", ("django/db/",)),
+)
+
+
+def make_trigger_token() -> str:
+    # Value for the X-Profile header; valid for PROFILING_TOKEN_MAX_AGE seconds
+    return signing.dumps("profile", salt=SIGNING_SALT)
+
+
+def is_valid_trigger(token, max_age) -> bool:
+    try:
+        return signing.loads(token, salt=SIGNING_SALT, max_age=max_age) == "profile"
+    except signing.BadSignature:
+        return False
+
+
+#Sampling stack profiler for a single thread
+class StackSampler:
+    # A background thread reads the target thread's stack every `interval`
+    # seconds and counts the folded stacks, the input format of flamegraph.pl
+    # and speedscope.
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.categories = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(frame.f_code)
+                frame = frame.f_back
+            self.categories[categorize(frames)] += 1
+            self.stacks[";".join(f"{code.co_name} ({_short(code.co_filename)}:{code.co_firstlineno})" for code in reversed(frames))] += 1
+
+    def write(self, directory, name) -> str:
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{name}")
+        with open(f"{base}.folded", "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        samples = sum(self.categories.values())
+        summary = {
+            "elapsed_ms": round(self.elapsed * 1000, 3),
+            "samples": samples,
+            # Sample share scaled to wall time
+            "categories_ms": {
+                category: round(self.elapsed * 1000 * count / samples, 3) for category, count in self.categories.most_common()
+            } if samples else {},
+        }
+        with open(f"{base}.json", "w") as f:
+            json.dump(summary, f, indent=2)
+        return base
+
+
+def categorize(codes) -> str:
+    for code in codes:
+        filename = code.co_filename.replace(os.sep, "/")
+        for category, markers in CATEGORIES:
+            if any(marker in filename for marker in markers):
+                return category
+    return "other"
+
+
+def _short(filename):
+    # Trims install prefixes so frames read "django/db/models/query.py"
+    filename = filename.replace(os.sep, "/")
+    if "site-packages/" in filename:
+        return filename.rsplit("site-packages/", 1)[1]
+    if "/lib/python3" in filename:
+        return filename.rsplit("/lib/python3", 1)[1].split("/", 1)[-1]
+    root = str(settings.BASE_DIR).replace(os.sep, "/") + "/"
+    return filename[len(root):] if filename.startswith(root) else filename
+
+
+def profile_name(request) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "-", f"{request.method}-{request.path}").strip("-")[:100]
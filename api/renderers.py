@@ -0,0 +1,28 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+#orjson-backed JSON renderer
+class FastJSONRenderer(JSONRenderer):
+    # Serialises UUIDs, datetimes and dict/list/str subclasses natively in
+    # orjson; anything else (Decimal, lazy strings, querysets) goes through
+    # DRF's encoder. Without orjson installed, or when the client asks for
+    # indented output, this is DRF's JSONRenderer unchanged.
+    OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+        ret = orjson.dumps(data, default=self.encoder.default, option=self.OPTIONS)
+        # Escape the line and paragraph separators as JSONRenderer does, since
+        # they are newlines to JavaScript and break JSON embedded in a script
+        return ret.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
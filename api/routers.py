@@ -0,0 +1,120 @@
+import contextvars
+import random
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+# Per-request routing state; DatabaseRoutingMiddleware gives every request a fresh one
+_state = contextvars.ContextVar("replica_routing", default=None)
+
+
+class RoutingState:
+    def __init__(self):
+        self.client = None
+        self.wrote = False
+        self._pinned = None
+
+    def pinned(self) -> bool:
+        # One cache read per request, and only once a read needs routing
+        if self._pinned is None:
+            self._pinned = self.client is not None and bool(_pin_cache().get(_pin_key(self.client)))
+        return self._pinned
+
+
+def begin_request():
+    return _state.set(RoutingState())
+
+
+def end_request(token):
+    _state.reset(token)
+
+
+def set_client(userId):
+    # Called by the authentication class once the caller is known
+    state = _state.get()
+    if state is not None:
+        state.client = userId
+
+
+def pin_to_primary(userId):
+    # Reads for this user go to the primary for REPLICA_PIN_SECONDS, so they see their own writes
+    if not settings.DATABASE_REPLICAS:
+        return
+    _pin_cache().set(_pin_key(userId), True, settings.REPLICA_PIN_SECONDS)
+
+
+def _pin_cache():
+    return caches[settings.REPLICA_PIN_CACHE_ALIAS]
+
+
+def _pin_key(userId):
+    return f"primary-pin:{uuid.UUID(str(userId)).hex}"
+
+
+#Replica lag, probed at most once per REPLICA_LAG_CHECK_INTERVAL per process
+class LagMonitor:
+    POSTGRES_LAG_SQL = (
+        # An idle primary leaves the replay timestamp old; caught up means no lag
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.probes = {}
+
+    def lag(self, alias) -> float:
+        with self.lock:
+            checked_at, lag = self.probes.get(alias, (None, None))
+        if checked_at is not None and time.monotonic() - checked_at < settings.REPLICA_LAG_CHECK_INTERVAL:
+            return lag
+        lag = self.probe(alias)
+        with self.lock:
+            self.probes[alias] = (time.monotonic(), lag)
+        return lag
+
+    def probe(self, alias) -> float:
+        connection = connections[alias]
+        if connection.vendor != "postgresql":
+            return 0.0
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(self.POSTGRES_LAG_SQL)
+                return float(cursor.fetchone()[0])
+        except DatabaseError:
+            # Unreachable replicas are treated as infinitely behind
+            return float("inf")
+
+
+lag_monitor = LagMonitor()
+
+
+#Sends reads to replicas, except where that could show a client stale data
+class ReplicaRouter:
+    # Reads stay on the primary outside requests (management commands, shells),
+    # after a write earlier in the same request, for clients pinned by a recent
+    # write, and when every replica lags more than REPLICA_MAX_LAG_SECONDS.
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.wrote or state.pinned():
+            return DEFAULT_DB_ALIAS
+        replicas = [alias for alias in settings.DATABASE_REPLICAS if lag_monitor.lag(alias) <= settings.REPLICA_MAX_LAG_SECONDS]
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and not state.wrote:
+            state.wrote = True
+            if state.client is not None:
+                pin_to_primary(state.client)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,137 @@
+import re
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models import Q
+from .models import Membership, Organisation, OrganisationSearchTerm
+
+TOKEN_RE = re.compile(r"\w+")
+MAX_QUERY_TERMS = 8
+FIELDS = ("orgId", "name", "description")
+
+
+def tokenize(text) -> list:
+    term_length = OrganisationSearchTerm._meta.get_field("term").max_length
+    return [token[:term_length] for token in TOKEN_RE.findall(text.casefold())]
+
+
+def index_terms(name, description) -> dict:
+    # term -> OrganisationSearchTerm weight
+    weights = {}
+    for term in tokenize(name or ""):
+        weights[term] = weights.get(term, 0) | OrganisationSearchTerm.NAME
+    for term in tokenize(description or ""):
+        weights[term] = weights.get(term, 0) | OrganisationSearchTerm.DESCRIPTION
+    return weights
+
+
+#Full-text search on Postgres
+class PostgresSearch:
+    # Matches on the full-text vector of name and description, or on trigram
+    # similarity of the name (typos, partial words). Both are served by the GIN
+    # indexes from migration 0008, whose expressions match the ones below.
+    def __init__(self):
+        from django.contrib.postgres.lookups import TrigramSimilar
+        models.CharField.register_lookup(TrigramSimilar)
+
+    def search(self, user, text):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+        query = SearchQuery(text, config="simple", search_type="websearch")
+        return (
+            self.matching(Membership.objects.organisations_for(user), text)
+            .annotate(rank=SearchRank(self.vector(), query) + TrigramSimilarity("name", text))
+            .order_by("-rank", "orgId")
+            .values(*FIELDS)
+        )
+
+    def matching(self, organisations, text):
+        from django.contrib.postgres.search import SearchQuery
+        query = SearchQuery(text, config="simple", search_type="websearch")
+        return organisations.alias(document=self.vector()).filter(Q(document=query) | Q(name__trigram_similar=text))
+
+    def vector(self):
+        from django.contrib.postgres.search import SearchVector
+        return SearchVector("name", "description", config="simple")
+
+    def index(self, organisations, created=False):
+        # Postgres maintains the GIN indexes itself
+        pass
+
+
+#Inverted index search for every other database
+class InvertedIndexSearch:
+    # Organisations are tokenized in Python into OrganisationSearchTerm rows,
+    # kept current by the post_save signal (and by bulk imports, which skip it).
+    # Every query word must prefix-match a term; a match in the name scores
+    # above one in the description, and an exact word above a prefix.
+    def search(self, user, text):
+        terms = list(dict.fromkeys(tokenize(text)))[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+        # Prefix matches as index range scans on (term, organisation)
+        ranges = Q()
+        for term in terms:
+            ranges |= Q(term__gte=term, term__lt=term + "\U0010ffff")
+        memberships = Membership.objects.filter(user=user).values("organisation_id")
+        rows = OrganisationSearchTerm.objects.filter(ranges, organisation_id__in=memberships)
+
+        scores = {}
+        for orgId, term, weight in rows.values_list("organisation_id", "term", "weight"):
+            best = scores.setdefault(orgId, [0.0] * len(terms))
+            for i, query_term in enumerate(terms):
+                if term.startswith(query_term):
+                    best[i] = max(best[i], weight * (1.0 if term == query_term else 0.5))
+        ranked = sorted((-sum(best), orgId) for orgId, best in scores.items() if all(best))
+        return RankedOrganisations([orgId for _, orgId in ranked])
+
+    def index(self, organisations, created=False):
+        # Replaces the terms of the given organisations
+        organisations = list(organisations)
+        terms = [
+            OrganisationSearchTerm(organisation=organisation, term=term, weight=weight)
+            for organisation in organisations
+            for term, weight in index_terms(organisation.name, organisation.description).items()
+        ]
+        if created:
+            # New organisations have no terms yet: a single INSERT
+            OrganisationSearchTerm.objects.bulk_create(terms)
+            return
+        with transaction.atomic():
+            OrganisationSearchTerm.objects.filter(organisation__in=organisations).delete()
+            OrganisationSearchTerm.objects.bulk_create(terms)
+
+
+class RankedOrganisations:
+    # Ranked orgIds that load organisation rows only for the slice a page asks for
+    def __init__(self, orgIds):
+        self.orgIds = orgIds
+
+    def __len__(self):
+        return len(self.orgIds)
+
+    def __getitem__(self, index):
+        orgIds = self.orgIds[index]
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        rows = {row["orgId"]: row for row in Organisation.objects.filter(orgId__in=orgIds).values(*FIELDS)}
+        return [rows[orgId] for orgId in orgIds if orgId in rows]
+
+
+#Picks the backend for the primary database on first use
+class OrganisationSearch:
+    def __init__(self):
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            vendor = connections[DEFAULT_DB_ALIAS].vendor
+            self._backend = PostgresSearch() if vendor == "postgresql" else InvertedIndexSearch()
+        return self._backend
+
+    def search(self, user, text):
+        return self.backend.search(user, text)
+
+    def index(self, organisations, created=False):
+        self.backend.index(organisations, created=created)
+
+
+organisation_search = OrganisationSearch()
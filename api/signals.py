@@ -0,0 +1,38 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from .cache import user_cache, visibility_cache
+from .models import CustomUser, Membership, Organisation
+from .search import organisation_search
+
+
+#Drop cached projections whenever a user row changes
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_user_cache(sender, instance, **kwargs):
+    user_cache.invalidate(instance)
+
+
+#Membership changes alter who can see whom
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def invalidate_visibility_cache(sender, instance, **kwargs):
+    visibility_cache.invalidate_users([instance.user_id])
+
+
+@receiver(m2m_changed, sender=Organisation.members.through)
+def invalidate_visibility_on_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            visibility_cache.invalidate_users([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        visibility_cache.invalidate_users(pk_set)
+    elif action == "pre_clear":
+        visibility_cache.invalidate_users(instance.memberships.values_list("user_id", flat=True))
+
+
+#Keep the search index in step with organisation names and descriptions
+@receiver(post_save, sender=Organisation)
+def index_organisation(sender, instance, created, update_fields, **kwargs):
+    if update_fields is not None and not {"name", "description"} & set(update_fields):
+        return
+    organisation_search.index([instance], created=created)
@@ -1,17 +1,60 @@
+import io
+import os
+import tempfile
+import threading
+import time
+import uuid
 import unittest
+from unittest import mock
 import requests
 import jwt
 import json
 from rest_framework_simplejwt.tokens import AccessToken
 from datetime import datetime, timedelta, timezone
+from contextlib import contextmanager
 from rest_framework import status
-from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
 from rest_framework.test import APIClient
-from .models import CustomUser, Organisation
+from .models import CustomUser, Organisation, Membership, OrganisationSearchTerm, RevokedToken
+from .authentication import TokenUserAuthentication
+from .bulk import import_users, parse_rows
+from .db.pool import ConnectionPool, PoolTimeout, ping
+from .cache import user_cache
+from .hashing import HashingPool
+from .metrics import Registry
+from .middleware import ProfilingMiddleware
+from .profiling import make_trigger_token
+from .renderers import FastJSONRenderer
+from .revocation import BloomFilter, RevocationList, revocation_list
+from .search import PostgresSearch, organisation_search
+from .uuids import uuid7
+from .throttling import ConcurrencyLimiter, credential_limiter
+from . import routers
+from . import tokens
 from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
 
 SECRET_KEY=settings.SECRET_KEY
 
+# Keeps periodic revocation-list syncs out of the query counts below;
+# RevocationTestCase syncs explicitly
+revocation_sync = override_settings(REVOCATION_SYNC_INTERVAL=float("inf"), REVOCATION_REBUILD_INTERVAL=float("inf"))
+
+
+def setUpModule():
+    revocation_sync.enable()
+    revocation_list.maybe_sync()
+
+
+def tearDownModule():
+    revocation_sync.disable()
+
 
 class TokenGenerationTestCase(TestCase):
     
@@ -143,7 +186,10 @@ class AccessControlTestCase(TestCase):
         data = {
             "userId": userId
         }
+        # Only members can add to an organisation; act as its owner for this request
+        self.client.force_authenticate(user=Organisation.objects.get(orgId=orgId).owner)
         response = self.client.post(url, data, format="json")
+        self.client.force_authenticate(user=None)
         self.assertEqual(response.status_code, 200)
         print(f"---Added user to organisation - {response.json()}")
 
@@ -230,6 +276,1238 @@ class CombinedTestCase(TestCase):
         print(f"---Errors handled- 🛡️🐛✔️")
         
 
+class MembershipTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = CustomUser.objects.create(firstName="John", lastName="Doe", email="owner@example.com")
+        self.member = CustomUser.objects.create(firstName="Jane", lastName="Smith", email="member@example.com")
+        self.org = Organisation.objects.create(owner=self.owner, name="John's Organisation", description="")
+
+    def test_owner_membership_created_with_organisation(self):
+        membership = Membership.objects.get(user=self.owner, organisation=self.org)
+        self.assertEqual(membership.role, Membership.OWNER)
+        print(f"---Owner Membership Created - 🏢👑✔️")
+
+    def test_add_user_keeps_single_membership_per_user(self):
+        self.client.force_authenticate(user=self.owner)
+        for userId in (self.member.userId, self.owner.userId):
+            response = self.client.post(f"/api/organisations/{self.org.orgId}/users", {"userId": userId}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(Membership.objects.get(user=self.owner, organisation=self.org).role, Membership.OWNER)
+        self.assertEqual(Membership.objects.get(user=self.member, organisation=self.org).role, Membership.MEMBER)
+        self.assertEqual(list(Membership.objects.organisations_for(self.owner)), [self.org])
+        print(f"---Membership Index Kept In Sync - 🔗🏢✔️")
+
+
+class OrganisationPaginationTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create(firstName="John", lastName="Doe", email="pager@example.com")
+        self.orgs = [
+            Organisation.objects.create(owner=self.user, name=f"Organisation {i}", description="")
+            for i in range(5)
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def test_cursor_walks_every_organisation_once(self):
+        seen = []
+        url = "/api/organisations?limit=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            page = response.json()["organisations"]
+            self.assertLessEqual(len(page), 2)
+            seen.extend(org["orgId"] for org in page)
+            url = response.json()["next"]
+
+        self.assertEqual(sorted(seen), sorted(str(org.orgId) for org in self.orgs))
+        print(f"---Cursor Pagination Covers All Organisations - 📄➡️📄✔️")
+
+    def test_page_size_is_capped(self):
+        response = self.client.get("/api/organisations?limit=100000")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()["organisations"]), 5)
+        self.assertIsNone(response.json()["next"])
+        print(f"---Page Size Enforced By Server - 📏✔️")
+
+
+class TokenUserAuthenticationTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create(firstName="John", lastName="Doe", email="claims@example.com")
+        Organisation.objects.create(owner=self.user, name="John's Organisation", description="")
+        self.token = tokens.AccessToken.for_user(self.user)
+
+    def test_authentication_skips_user_query(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/organisations")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        print(f"---Authenticated Without User Lookup - 🔑⚡✔️")
+
+    def test_deferred_fields_load_on_access(self):
+        request = APIClient().get("/").wsgi_request
+        request.META["HTTP_AUTHORIZATION"] = f"Bearer {self.token}"
+        user, _ = TokenUserAuthentication().authenticate(request)
+        with self.assertNumQueries(0):
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertEqual(user.email, "claims@example.com")
+        with self.assertNumQueries(1):
+            self.assertEqual(user.firstName, "John")
+        print(f"---Token User Loads Fields Lazily - 💤👤✔️")
+
+
+class DeletedUserTokenTestCase(TransactionTestCase):
+    # Foreign keys are checked when the transaction commits, so this needs real commits
+
+    def test_token_of_deleted_user_cannot_create_organisations(self):
+        user = CustomUser.objects.create(firstName="John", lastName="Doe", email="deleted@example.com")
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens.AccessToken.for_user(user)}")
+        user.delete()
+
+        response = client.post("/api/organisations", {"name": "Ghost Org", "description": ""}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json()["statusCode"], 401)
+        self.assertFalse(Organisation.objects.filter(name="Ghost Org").exists())
+        print(f"---Deleted User's Token Can't Write - 👻🔑✔️")
+
+
+class UserCacheTestCase(TestCase):
+
+    def setUp(self):
+        caches[settings.USER_CACHE_ALIAS].clear()
+        self.user = CustomUser.objects.create(firstName="John", lastName="Doe", email="cached@example.com")
+
+    def test_projection_cached_after_first_lookup(self):
+        with self.assertNumQueries(1):
+            user_cache.get_by_id(self.user.userId)
+        with self.assertNumQueries(0):
+            projection = user_cache.get_by_id(self.user.userId)
+        self.assertEqual(projection["firstName"], "John")
+        self.assertNotIn("password", projection)
+        print(f"---User Projection Served From Cache - 🗃️👤✔️")
+
+    def test_save_invalidates_projection(self):
+        user_cache.get_by_id(self.user.userId)
+        self.user.firstName = "Johnny"
+        self.user.save()
+        self.assertEqual(user_cache.get_by_id(self.user.userId)["firstName"], "Johnny")
+        print(f"---Cache Invalidated On Save - ♻️👤✔️")
+
+    def test_missing_user_is_not_cached(self):
+        userId = uuid7()
+        self.assertIsNone(user_cache.get_by_id(userId))
+        self.assertIsNone(user_cache.get_by_id("not-a-uuid"))
+        # Registered through another worker: found on the very next lookup
+        CustomUser.objects.create(userId=userId, firstName="Jane", lastName="Doe", email="later@example.com")
+        self.assertEqual(user_cache.get_by_id(userId)["email"], "later@example.com")
+        print(f"---Missing Users Not Cached - 🗃️🆕✔️")
+
+    def test_login_not_blocked_by_another_workers_miss(self):
+        client = APIClient()
+        data = {"email": "elsewhere@example.com", "password": "secret"}
+        self.assertEqual(client.post("/auth/login", data, format="json").status_code, status.HTTP_401_UNAUTHORIZED)
+        # bulk_create sends no signals, like a registration handled by another worker
+        CustomUser.objects.bulk_create([CustomUser(firstName="Jane", lastName="Doe", email="elsewhere@example.com", password=make_password("secret"))])
+        self.assertEqual(client.post("/auth/login", data, format="json").status_code, status.HTTP_200_OK)
+        print(f"---Login Ignores Stale Misses - 🚫🗃️🔑✔️")
+
+    def test_member_added_right_after_registering_elsewhere(self):
+        org = Organisation.objects.create(owner=self.user, name="John's Organisation", description="")
+        client = APIClient()
+        client.force_authenticate(self.user)
+        userId = uuid7()
+        self.assertEqual(client.post(f"/api/organisations/{org.orgId}/users", {"userId": str(userId)}, format="json").status_code, status.HTTP_400_BAD_REQUEST)
+        CustomUser.objects.bulk_create([CustomUser(userId=userId, firstName="Jane", lastName="Doe", email="joined@example.com")])
+        self.assertEqual(client.post(f"/api/organisations/{org.orgId}/users", {"userId": str(userId)}, format="json").status_code, status.HTTP_200_OK)
+        self.assertTrue(Membership.objects.filter(user_id=userId, organisation=org).exists())
+        print(f"---New Users Addable At Once - 🚫🗃️👥✔️")
+
+
+class HashingPoolTestCase(TestCase):
+
+    def test_non_string_password_is_a_client_error(self):
+        data = {"firstName": "John", "lastName": "Doe", "email": "number@example.com", "password": 123}
+        response = APIClient().post("/auth/register", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(response.json()["errors"][0], {"field": "password", "message": "Invalid Input"})
+        self.assertFalse(CustomUser.objects.filter(email="number@example.com").exists())
+        print(f"---Non-String Password Rejected - 🔢🚫✔️")
+
+    def test_pool_caps_concurrent_hashes(self):
+        pool = HashingPool(workers=2)
+        lock, running, peak = threading.Lock(), [0], [0]
+
+        def job():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+        futures = [pool.submit(job) for _ in range(6)]
+        self.assertGreater(pool.stats()["queue_depth"], 0)
+        for future in futures:
+            future.result()
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(pool.stats()["completed"], 6)
+        print(f"---Hashing Pool Bounded - 🧮🚧✔️")
+
+    def test_requests_past_the_cap_get_503_before_any_work(self):
+        inside, release = threading.Event(), threading.Event()
+
+        def slow_hash(password):
+            inside.set()
+            release.wait()
+            # Stop the held request here; it needs no database connection this way
+            raise RuntimeError("released")
+
+        def register(email):
+            data = {"firstName": "John", "lastName": "Doe", "email": email, "password": "testpassword"}
+            return APIClient().post("/auth/register", data, format="json")
+
+        def held():
+            try:
+                register("held@example.com")
+            except RuntimeError:
+                pass
+
+        with mock.patch.object(credential_limiter, "_slots", threading.BoundedSemaphore(1)), \
+                mock.patch("api.hashing.hashing_pool.make_password", side_effect=slow_hash) as make_password:
+            worker = threading.Thread(target=held)
+            worker.start()
+            inside.wait()
+            with self.assertNumQueries(0):
+                response = register("busy@example.com")
+            release.set()
+            worker.join()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(response.json()["statusCode"], 503)
+        self.assertEqual(make_password.call_count, 1)
+        print(f"---Busy Server Sheds Registration - 🔥🚫✔️")
+
+class RegistrationQueryCountTestCase(TestCase):
+
+    def test_registration_writes_each_row_once(self):
+        data = {"firstName": "John", "lastName": "Doe", "email": "count@example.com", "password": "testpassword"}
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().post("/auth/register", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # The test case wraps requests in a transaction, so atomic() shows up as a savepoint
+        statements = [query["sql"].split()[0].upper() for query in queries]
+        # Without Postgres full-text search, the organisation's search terms are one more INSERT
+        inserts = 3 if connection.vendor == "postgresql" else 4
+        self.assertEqual(statements, ["SAVEPOINT", *["INSERT"] * inserts, "RELEASE"])
+        print(f"---Registration Inserts Each Row Once - ✍️1️⃣✔️")
+
+    def test_duplicate_email_maps_to_422(self):
+        data = {"firstName": "John", "lastName": "Doe", "email": "dup@example.com", "password": "testpassword"}
+        APIClient().post("/auth/register", data, format="json")
+        response = APIClient().post("/auth/register", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(response.json()["errors"][0], {"field": "email", "message": "Already Exists"})
+        self.assertEqual(CustomUser.objects.filter(email="dup@example.com").count(), 1)
+        self.assertEqual(Organisation.objects.filter(owner__email="dup@example.com").count(), 1)
+        print(f"---Duplicate Email Rolled Back - 🔁🚫✔️")
+
+
+@override_settings(BULK_IMPORT_KEY="import-key", BULK_IMPORT_WORKERS=1)
+class BulkImportTestCase(TestCase):
+
+    def setUp(self):
+        CustomUser.objects.create(firstName="Old", lastName="User", email="taken@example.com")
+        self.ndjson = "\n".join([
+            json.dumps({"firstName": "John", "lastName": "Doe", "email": "bulk1@example.com", "password": "pw"}),
+            json.dumps({"firstName": "Jane", "lastName": "Doe", "email": "bulk2@example.com", "password": "pw", "phone": "123"}),
+            "not json",
+            json.dumps({"firstName": "Jim", "lastName": "Doe", "email": "bulk1@example.com", "password": "pw"}),
+            json.dumps({"firstName": "Tim", "lastName": "Doe", "email": "taken@example.com", "password": "pw"}),
+            json.dumps({"firstName": "", "lastName": "Doe", "email": "bulk3@example.com", "password": "pw"}),
+        ])
+
+    def test_import_creates_users_and_reports_row_errors(self):
+        result = import_users(parse_rows(self.ndjson), workers=1, chunk_size=2)
+
+        self.assertEqual(result["created"], 2)
+        self.assertEqual([(error["row"], error["message"]) for error in result["errors"]], [
+            (3, "Invalid Row"), (4, "Already Exists"), (5, "Already Exists"), (6, "Invalid Input"),
+        ])
+        user = CustomUser.objects.get(email="bulk2@example.com")
+        self.assertTrue(user.check_password("pw"))
+        self.assertEqual(Membership.objects.get(user=user).organisation.name, "Jane's Organisation")
+        print(f"---Bulk Import With Per-Row Errors - 📥👥✔️")
+
+    def test_long_password_accepted_like_registration(self):
+        password = "p" * 200
+        data = {"firstName": "Long", "lastName": "Doe", "email": "long@example.com", "password": password}
+        self.assertEqual(APIClient().post("/auth/register", data, format="json").status_code, status.HTTP_201_CREATED)
+
+        result = import_users(parse_rows(json.dumps({**data, "email": "longbulk@example.com"})))
+        self.assertEqual((result["created"], result["errors"]), (1, []))
+        self.assertTrue(CustomUser.objects.get(email="longbulk@example.com").check_password(password))
+        print(f"---Bulk Import Accepts Long Passwords - 📥🔑✔️")
+
+    def test_command_imports_file(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write('firstName,lastName,email,password\r\n"Multi\r\nLine",Doe,command@example.com,pw\r\n')
+        self.addCleanup(os.remove, f.name)
+        out = io.StringIO()
+        call_command("import_users", f.name, workers=1, stdout=out)
+        self.assertIn("Imported 1 users, 0 rows rejected", out.getvalue())
+        self.assertEqual(CustomUser.objects.get(email="command@example.com").firstName, "Multi\r\nLine")
+        print(f"---Import Command Streams A File - 📥📄✔️")
+
+    def test_csv_endpoint_requires_import_key(self):
+        body = "firstName,lastName,email,password\nJohn,Doe,csv@example.com,pw\n"
+        client = APIClient()
+        response = client.post("/auth/register/bulk", body, content_type="text/csv")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        response = client.post("/auth/register/bulk", body, content_type="text/csv", HTTP_X_IMPORT_KEY="import-key")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["data"]["created"], 1)
+        self.assertTrue(CustomUser.objects.filter(email="csv@example.com").exists())
+        print(f"---Bulk Import Endpoint Protected - 🔐📥✔️")
+
+    def test_conflicts_on_retry_fail_only_their_rows(self):
+        from . import bulk
+        insert = bulk._bulk_insert
+
+        # The taken email keeps conflicting, as if claimed concurrently after every re-check
+        def conflicting(pending):
+            if any(row["email"] == "racing@example.com" for _, row, _ in pending):
+                raise IntegrityError("unique_user_email_ci")
+            insert(pending)
+
+        text = "firstName,lastName,email,password\nA,Doe,free1@example.com,pw\nB,Doe,racing@example.com,pw\nC,Doe,free2@example.com,pw\n"
+        with mock.patch.object(bulk, "_bulk_insert", side_effect=conflicting):
+            result = import_users(parse_rows(text, "csv"))
+        self.assertEqual(result["created"], 2)
+        self.assertEqual(result["errors"], [{"row": 2, "field": "email", "message": "Already Exists"}])
+        print(f"---Bulk Retry Conflicts Reported Per Row - 📥🔁✔️")
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=128)
+    def test_upload_read_line_by_line_past_body_limit(self):
+        body = "firstName,lastName,email,password\n" + "".join(f"Bulk,User,big{i}@example.com,pw\n" for i in range(5))
+        self.assertGreater(len(body), 128)
+        response = APIClient().post("/auth/register/bulk", body, content_type="text/csv", HTTP_X_IMPORT_KEY="import-key")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["data"]["created"], 5)
+        print(f"---Large Uploads Read Line By Line - 📥📜✔️")
+
+
+class BatchAddMembersTestCase(TestCase):
+
+    def setUp(self):
+        self.owner = CustomUser.objects.create(firstName="John", lastName="Doe", email="batch-owner@example.com")
+        self.member = CustomUser.objects.create(firstName="Jane", lastName="Doe", email="batch-member@example.com")
+        self.new_users = [
+            CustomUser.objects.create(firstName=f"User{i}", lastName="Doe", email=f"batch{i}@example.com")
+            for i in range(3)
+        ]
+        self.org = Organisation.objects.create(owner=self.owner, name="John's Organisation", description="")
+        self.org.members.add(self.member)
+
+    def test_batch_add_reports_per_id_results(self):
+        data = {
+            "userIds": [str(self.new_users[0].userId), str(self.member.userId), str(uuid.uuid4()), "garbage"],
+            "emails": ["batch1@example.com", "batch2@example.com", "nobody@example.com"],
+        }
+        client = APIClient()
+        client.force_authenticate(user=self.member)
+        # Membership check, user lookup, existing members, INSERT; the test case wraps
+        # requests in a transaction, so the INSERT's atomic() adds a savepoint and release
+        with self.assertNumQueries(6):
+            response = client.post(f"/api/organisations/{self.org.orgId}/users", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        results = [result["status"] for result in response.json()["data"]["results"]]
+        self.assertEqual(results, ["added", "already_member", "not_found", "not_found", "added", "added", "not_found"])
+        self.assertEqual(self.org.members.count(), 5)
+        print(f"---Batch Members Added In Constant Queries - 👥➕🏢✔️")
+
+    def test_members_added_concurrently_are_not_reported_as_added(self):
+        racing, fresh = self.new_users[0], self.new_users[1]
+        # Another request adds racing after this one has looked up the existing members
+        Membership.objects.create(user=racing, organisation=self.org)
+        with mock.patch.object(Membership.objects, "member_ids", return_value=set()):
+            added = Membership.objects.add_members(self.org.orgId, [racing.userId, fresh.userId])
+        self.assertEqual(added, {fresh.userId})
+        self.assertEqual(self.org.members.count(), 4)
+        print(f"---Concurrent Adds Reported Accurately - 👥🏁✔️")
+
+    def test_only_members_can_add_and_nothing_leaks(self):
+        data = {"emails": ["batch0@example.com", "nobody@example.com"]}
+        url = f"/api/organisations/{self.org.orgId}/users"
+        self.assertEqual(APIClient().post(url, data, format="json").status_code, status.HTTP_401_UNAUTHORIZED)
+
+        outsider = APIClient()
+        outsider.force_authenticate(user=self.new_users[2])
+        not_allowed = outsider.post(url, data, format="json")
+        not_found = outsider.post(f"/api/organisations/{uuid.uuid4()}/users", data, format="json")
+        self.assertEqual(not_allowed.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual((not_allowed.status_code, not_allowed.json()), (not_found.status_code, not_found.json()))
+        single = outsider.post(url, {"userId": str(self.new_users[2].userId)}, format="json")
+        self.assertEqual(single.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.org.members.count(), 2)
+        print(f"---Only Members Add Members - 🔐👥✔️")
+
+
+class OrganisationPermissionTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = CustomUser.objects.create(firstName="John", lastName="Doe", email="perm-owner@example.com")
+        self.outsider = CustomUser.objects.create(firstName="Jim", lastName="Doe", email="perm-outsider@example.com")
+        self.org = Organisation.objects.create(owner=self.owner, name="John's Organisation", description="")
+        members = [
+            CustomUser.objects.create(firstName="Member", lastName="Doe", email=f"perm{i}@example.com")
+            for i in range(20)
+        ]
+        Membership.objects.add_members(self.org.orgId, [member.userId for member in members])
+
+    def test_member_check_is_one_query(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens.AccessToken.for_user(self.owner)}")
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/organisations/{self.org.orgId}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["data"]["name"], "John's Organisation")
+        print(f"---Organisation Access Checked In One Query - 🏢🔍✔️")
+
+    def test_unknown_or_foreign_organisation_is_404(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens.AccessToken.for_user(self.outsider)}")
+        for orgId in (self.org.orgId, uuid.uuid4(), "not-a-uuid"):
+            response = self.client.get(f"/api/organisations/{orgId}")
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        print(f"---Foreign And Unknown Organisations Hidden - 🏢🚫✔️")
+
+
+class UserVisibilityTestCase(TestCase):
+
+    def setUp(self):
+        caches[settings.USER_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.viewer = CustomUser.objects.create(firstName="John", lastName="Doe", email="viewer@example.com")
+        self.colleague = CustomUser.objects.create(firstName="Jane", lastName="Doe", email="colleague@example.com")
+        self.stranger = CustomUser.objects.create(firstName="Jim", lastName="Doe", email="stranger@example.com")
+        self.org = Organisation.objects.create(owner=self.viewer, name="John's Organisation", description="")
+        self.org.members.add(self.colleague)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens.AccessToken.for_user(self.viewer)}")
+
+    def test_visibility_and_profile_in_one_query(self):
+        for target, expected in ((self.viewer, 200), (self.colleague, 200), (self.stranger, 404)):
+            with self.assertNumQueries(1):
+                response = self.client.get(f"/api/users/{target.userId}")
+            self.assertEqual(response.status_code, expected)
+        print(f"---User Visibility Resolved In One Query - 👀1️⃣✔️")
+
+    @override_settings(VISIBILITY_CACHE_TIMEOUT=60)
+    def test_cached_decisions_invalidated_by_membership_changes(self):
+        self.client.get(f"/api/users/{self.colleague.userId}")
+        with self.assertNumQueries(0):
+            response = self.client.get(f"/api/users/{self.colleague.userId}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.client.get(f"/api/users/{self.stranger.userId}").status_code, 404)
+        self.client.post(f"/api/organisations/{self.org.orgId}/users", {"userId": self.stranger.userId}, format="json")
+        self.assertEqual(self.client.get(f"/api/users/{self.stranger.userId}").status_code, 200)
+        print(f"---Visibility Cache Follows Memberships - 👀♻️✔️")
+
+
+class TrafficCaptureTestCase(TestCase):
+
+    def test_capture_writes_sanitized_jsonl(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "traffic.jsonl")
+            with override_settings(TRAFFIC_CAPTURE_PATH=path, TRAFFIC_CAPTURE_SAMPLE_RATE=1.0):
+                client = APIClient()
+                data = {"firstName": "John", "lastName": "Doe", "email": "capture@example.com", "password": "secret"}
+                token = client.post("/auth/register", data, format="json").json()["data"]["accessToken"]
+                client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+                client.get("/api/organisations")
+
+            with open(path) as f:
+                register, organisations = [json.loads(line) for line in f]
+
+        self.assertEqual(register["body"]["password"], "[REDACTED]")
+        self.assertEqual(register["response"]["data"]["accessToken"], "[REDACTED]")
+        self.assertNotIn("secret", json.dumps(register))
+        self.assertEqual(register["status"], 201)
+        user = CustomUser.objects.get(email="capture@example.com")
+        self.assertEqual(organisations["userId"], str(user.userId))
+        self.assertGreater(organisations["durationMs"], 0)
+        print(f"---Traffic Captured Without Credentials - 📼🔒✔️")
+
+    def test_capture_redacts_query_headers_and_emails(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "traffic.jsonl")
+            with override_settings(TRAFFIC_CAPTURE_PATH=path, TRAFFIC_CAPTURE_SAMPLE_RATE=1.0):
+                client = APIClient()
+                data = {"firstName": "Jane", "lastName": "Doe", "email": "private@example.com", "password": "secret"}
+                token = client.post("/auth/register", data, format="json").json()["data"]["accessToken"]
+                client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}", HTTP_COOKIE="sessionid=cookie-value")
+                client.get("/api/organisations?limit=5&token=query-secret&email=private@example.com")
+                client.post("/auth/token/refresh", {"refresh": "refresh-secret", "access": "access-secret"}, format="json")
+
+            with open(path) as f:
+                content = f.read()
+            register, organisations, refresh = [json.loads(line) for line in content.splitlines()]
+
+        for secret in ("private@example.com", token, "cookie-value", "query-secret", "refresh-secret", "access-secret"):
+            self.assertNotIn(secret, content)
+        self.assertEqual(register["body"]["email"], register["response"]["data"]["user"]["email"])
+        self.assertTrue(register["body"]["email"].endswith("@example.invalid"))
+        self.assertIn("limit=5", organisations["query"])
+        self.assertEqual(refresh["body"], {"refresh": "[REDACTED]", "access": "[REDACTED]"})
+        print(f"---Traffic Capture Redacts Everything Sensitive - 📼🙈✔️")
+
+
+class MetricsTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(firstName="John", lastName="Doe", email="metrics@example.com")
+        Organisation.objects.create(owner=self.user, name="John's Organisation", description="")
+
+    def test_metrics_endpoint_reports_routes_and_queries(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens.AccessToken.for_user(self.user)}")
+        client.get("/api/organisations")
+        response = client.get("/metrics")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        self.assertIn('http_requests_total{method="GET",route="/api/organisations",status="200"}', body)
+        self.assertIn('http_request_duration_seconds_bucket{le="+Inf",method="GET",route="/api/organisations"}', body)
+        self.assertIn('http_db_queries_per_request_bucket{le="1",method="GET",route="/api/organisations"}', body)
+        self.assertIn("password_hashing_queue_depth", body)
+        self.assertIn("# TYPE password_hashing_queue_depth gauge", body)
+        self.assertIn("# TYPE password_hashing_completed_total counter", body)
+        self.assertIn("# TYPE user_cache_hits_total counter", body)
+        print(f"---Metrics Exposed For Prometheus - 📈✔️")
+
+    @override_settings(METRICS_ALLOWED_NETWORKS=["10.1.0.0/16"])
+    def test_metrics_limited_to_allowed_networks(self):
+        client = APIClient()
+        self.assertEqual(client.get("/metrics", REMOTE_ADDR="10.1.2.3").status_code, status.HTTP_200_OK)
+        self.assertEqual(client.get("/metrics").status_code, status.HTTP_403_FORBIDDEN)
+        spoofed = client.get("/metrics", REMOTE_ADDR="203.0.113.9", HTTP_X_FORWARDED_FOR="10.1.2.3")
+        self.assertEqual(spoofed.status_code, status.HTTP_403_FORBIDDEN)
+        print(f"---Metrics Limited To Scrapers - 📈🔐✔️")
+
+    def test_multiprocess_snapshots_are_summed(self):
+        registry = Registry()
+        registry.inc("http_requests_total", {"route": "/", "method": "GET", "status": "200"}, 2)
+        with tempfile.TemporaryDirectory() as directory:
+            other = Registry()
+            other.inc("http_requests_total", {"route": "/", "method": "GET", "status": "200"}, 3)
+            with open(os.path.join(directory, "metrics-99999999.json"), "w") as f:
+                json.dump(other.snapshot(), f)
+            with override_settings(METRICS_MULTIPROC_DIR=directory):
+                body = registry.render()
+        self.assertIn('http_requests_total{method="GET",route="/",status="200"} 5', body)
+        print(f"---Worker Metrics Aggregated - 📈➕✔️")
+
+    @override_settings(METRICS_FLUSH_INTERVAL=1.0)
+    def test_stale_worker_gauges_dropped_and_files_removed(self):
+        other = Registry()
+        other.inc("http_requests_total", {"route": "/", "method": "GET", "status": "200"}, 3)
+        snapshot = other.snapshot()
+        snapshot["gauges"] = [["credentials_in_flight", "Credential requests running", {"pid": "99999999"}, 7]]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics-99999999.json")
+            with open(path, "w") as f:
+                json.dump(snapshot, f)
+            with override_settings(METRICS_MULTIPROC_DIR=directory):
+                self.assertIn('pid="99999999"', Registry().render())
+                os.utime(path, (time.time() - 60, time.time() - 60))
+                body = Registry().render()
+
+                own = Registry()
+                own.flush(directory)
+                own.remove(directory)
+                remaining = os.listdir(directory)
+        self.assertNotIn('pid="99999999"', body)
+        self.assertIn('http_requests_total{method="GET",route="/",status="200"} 3', body)
+        self.assertEqual(remaining, ["metrics-99999999.json"])
+        print(f"---Stale Worker Gauges Dropped - 📈🧹✔️")
+
+
 
 if __name__ == '__main__':
     unittest.main()
+
+
+class ProfilingTestCase(TestCase):
+
+    def register(self, client, email, **headers):
+        data = {"firstName": "John", "lastName": "Doe", "email": email, "password": "secret"}
+        return client.post("/auth/register", data, format="json", **headers)
+
+    def test_sampled_request_writes_flamegraph(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_OUTPUT_DIR=directory):
+                self.register(APIClient(), "profiled@example.com")
+            names = sorted(os.listdir(directory))
+            self.assertEqual([name.rsplit(".", 1)[1] for name in names], ["folded", "json"])
+            with open(os.path.join(directory, names[0])) as f:
+                stacks = f.read().splitlines()
+            with open(os.path.join(directory, names[1])) as f:
+                summary = json.load(f)
+
+        self.assertTrue(stacks)
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in stacks))
+        self.assertIn("password_hashing", summary["categories_ms"])
+        self.assertGreater(summary["samples"], 0)
+        print(f"---Sampled Request Profiled - 🔬🔥✔️")
+
+    def test_signed_header_triggers_profile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(PROFILING_HEADER_ENABLED=True, PROFILING_OUTPUT_DIR=directory):
+                client = APIClient()
+                forged = self.register(client, "forged@example.com", HTTP_X_PROFILE="profile")
+                self.assertNotIn("X-Profile", forged)
+                self.assertFalse(os.path.exists(directory) and os.listdir(directory))
+
+                signed = self.register(client, "signed@example.com", HTTP_X_PROFILE=make_trigger_token())
+                self.assertTrue(os.path.exists(os.path.join(directory, f"{signed['X-Profile']}.folded")))
+        print(f"---Signed Header Triggers Profile - ✍️🔬✔️")
+
+    def test_profiling_off_unloads_middleware(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+        print(f"---Profiling Off Costs Nothing - 💤✔️")
+
+
+class FastJSONRendererTestCase(TestCase):
+
+    def test_renders_uuids_and_datetimes(self):
+        orgId = uuid.uuid4()
+        data = {"orgId": orgId, "at": datetime(2024, 7, 1, 12, 30, tzinfo=timezone.utc), "ids": [orgId]}
+        rendered = json.loads(FastJSONRenderer().render(data, "application/json"))
+        self.assertEqual(rendered, {"orgId": str(orgId), "at": "2024-07-01T12:30:00Z", "ids": [str(orgId)]})
+        print(f"---UUIDs And Datetimes Rendered Natively - 🚀✔️")
+
+    def test_falls_back_to_stdlib_renderer(self):
+        orgId = uuid.uuid4()
+        with mock.patch("api.renderers.orjson", None):
+            rendered = FastJSONRenderer().render({"orgId": orgId}, "application/json")
+        self.assertEqual(json.loads(rendered), {"orgId": str(orgId)})
+        print(f"---Renderer Falls Back Without orjson - 🐢✔️")
+
+    def test_escapes_line_and_paragraph_separators(self):
+        data = {"description": "one\u2028two\u2029three"}
+        rendered = FastJSONRenderer().render(data, "application/json")
+        self.assertEqual(rendered, JSONRenderer().render(data, "application/json"))
+        self.assertNotIn("\u2028".encode(), rendered)
+        self.assertEqual(json.loads(rendered), data)
+        print(f"---Line Separators Escaped - 🚀🔒✔️")
+
+
+class ConditionalGetTestCase(TestCase):
+
+    def setUp(self):
+        caches[settings.USER_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.user = CustomUser.objects.create(firstName="John", lastName="Doe", email="etag@example.com")
+        self.org = Organisation.objects.create(owner=self.user, name="John's Organisation", description="")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens.AccessToken.for_user(self.user)}")
+
+    @override_settings(VISIBILITY_CACHE_TIMEOUT=60)
+    def test_unchanged_user_returns_304_without_queries(self):
+        first = self.client.get(f"/api/users/{self.user.userId}")
+        self.assertNotIn("updatedAt", first.json()["data"])
+        self.assertIn("Last-Modified", first)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(f"/api/users/{self.user.userId}", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(cached.content, b"")
+
+        self.user.firstName = "Johnny"
+        self.user.save()
+        changed = self.client.get(f"/api/users/{self.user.userId}", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(changed["ETag"], first["ETag"])
+        print(f"---Unchanged User Not Resent - 🏷️3️⃣0️⃣4️⃣✔️")
+
+    def test_unchanged_organisation_returns_304(self):
+        url = f"/api/organisations/{self.org.orgId}"
+        first = self.client.get(url)
+        self.assertEqual(set(first.json()["data"]), {"orgId", "name", "description"})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.org.name = "Renamed"
+        self.org.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, status.HTTP_200_OK)
+        print(f"---Unchanged Organisation Not Resent - 🏷️🏢✔️")
+
+    def test_validators_do_not_bypass_permissions(self):
+        etag = self.client.get(f"/api/organisations/{self.org.orgId}")["ETag"]
+        stranger = CustomUser.objects.create(firstName="Jim", lastName="Doe", email="stranger@example.com")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens.AccessToken.for_user(stranger)}")
+        response = self.client.get(f"/api/organisations/{self.org.orgId}", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        print(f"---Conditional GET Still Checks Access - 🏷️🔒✔️")
+
+    def test_not_modified_carries_validators(self):
+        url = f"/api/organisations/{self.org.orgId}"
+        first = self.client.get(url)
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(cached["ETag"], first["ETag"])
+        self.assertEqual(cached["Last-Modified"], first["Last-Modified"])
+        print(f"---304 Sends ETag And Last-Modified - 🏷️📅✔️")
+
+    def test_if_none_match_wins_over_if_modified_since(self):
+        url = f"/api/organisations/{self.org.orgId}"
+        first = self.client.get(url)
+        # Saved again within the same second: Last-Modified can't tell, the ETag can
+        Organisation.objects.filter(pk=self.org.pk).update(
+            name="Renamed", updatedAt=self.org.updatedAt + timedelta(microseconds=1))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"], HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["data"]["name"], "Renamed")
+        print(f"---If-None-Match Beats If-Modified-Since - 🏷️⏱️✔️")
+
+
+class FakeConnection:
+    # Stand-in for a DB-API connection
+    def __init__(self):
+        self.closed = False
+        self.healthy = True
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession(FakeConnection):
+    # Opens a transaction on the first statement unless in autocommit, like psycopg
+    def __init__(self):
+        super().__init__()
+        self.autocommit = False
+        self.in_transaction = False
+
+    @contextmanager
+    def cursor(self):
+        yield self
+
+    def execute(self, sql):
+        self.in_transaction = not self.autocommit
+
+    def rollback(self):
+        self.in_transaction = False
+
+
+class ConnectionPoolTestCase(TestCase):
+
+    def make_pool(self, **kwargs):
+        self.opened = []
+
+        def connect():
+            self.opened.append(FakeConnection())
+            return self.opened[-1]
+        return ConnectionPool(connect, check=lambda connection: connection.healthy, **kwargs)
+
+    def test_connections_reused_and_bounded(self):
+        pool = self.make_pool(min_size=1, max_size=2, timeout=0.05)
+        pool.prefill()
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        second = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+
+        stats = pool.stats()
+        self.assertEqual((stats["size"], stats["in_use"], stats["timeouts"]), (2, 2, 1))
+        self.assertEqual(stats["saturation"], 1.0)
+        self.assertEqual(len(self.opened), 2)
+        pool.release(second)
+        print(f"---Pool Reuses And Caps Connections - 🏊✔️")
+
+    def test_prefilled_connection_checked_out_idle(self):
+        pool = ConnectionPool(FakeSession, min_size=2, max_size=2, check=ping)
+        pool.prefill()
+        connections = [pool.acquire(), pool.acquire()]
+        self.assertEqual(pool.stats()["failed_checks"], 0)
+        self.assertFalse(any(connection.in_transaction for connection in connections))
+
+        connections[0].autocommit = True
+        pool.release(connections[0])
+        self.assertFalse(pool.acquire().in_transaction)
+        print(f"---Health Check Leaves No Open Transaction - 🏊🩺✔️")
+
+    def test_waiter_gets_released_connection(self):
+        pool = self.make_pool(max_size=1, timeout=2)
+        held = pool.acquire()
+        threading.Timer(0.05, pool.release, args=(held,)).start()
+        self.assertIs(pool.acquire(), held)
+        self.assertGreater(pool.stats()["max_wait_seconds"], 0.01)
+        print(f"---Waiter Served On Release - ⏳🏊✔️")
+
+    def test_unhealthy_and_idle_connections_replaced(self):
+        pool = self.make_pool(max_size=2, idle_timeout=60)
+        stale = pool.acquire()
+        pool.release(stale)
+        stale.healthy = False
+        fresh = pool.acquire()
+        self.assertIsNot(fresh, stale)
+        self.assertTrue(stale.closed)
+        self.assertEqual(pool.stats()["failed_checks"], 1)
+
+        pool.release(fresh)
+        pool.idle_timeout = 0
+        replacement = pool.acquire()
+        self.assertTrue(fresh.closed)
+        self.assertEqual(pool.stats()["size"], 1)
+        pool.release(replacement, broken=True)
+        self.assertEqual(pool.stats()["size"], 0)
+        print(f"---Broken And Idle Connections Replaced - 🩺🏊✔️")
+
+
+@override_settings(DATABASE_REPLICAS=["replica1", "replica2"], REPLICA_PIN_SECONDS=60, REPLICA_MAX_LAG_SECONDS=5, REPLICA_LAG_CHECK_INTERVAL=60)
+class ReplicaRouterTestCase(TestCase):
+
+    def setUp(self):
+        caches[settings.REPLICA_PIN_CACHE_ALIAS].clear()
+        routers.lag_monitor.probes.clear()
+        self.router = routers.ReplicaRouter()
+        self.userId = uuid.uuid4()
+        self.lags = {"replica1": 0.0, "replica2": 0.0}
+        patcher = mock.patch.object(routers.lag_monitor, "probe", side_effect=lambda alias: self.lags[alias])
+        self.probe = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, client=None):
+        token = routers.begin_request()
+        self.addCleanup(routers.end_request, token)
+        if client:
+            routers.set_client(client)
+
+    def test_reads_pinned_to_primary_after_write(self):
+        self.request(self.userId)
+        self.assertIn(self.router.db_for_read(CustomUser), {"replica1", "replica2"})
+        self.router.db_for_write(Organisation)
+        self.assertEqual(self.router.db_for_read(CustomUser), "default")
+
+        # The client's next request still reads its own writes
+        self.request(self.userId)
+        self.assertEqual(self.router.db_for_read(Organisation), "default")
+        self.request(uuid.uuid4())
+        self.assertIn(self.router.db_for_read(Organisation), {"replica1", "replica2"})
+        print(f"---Writers Read From Primary - ✍️📌✔️")
+
+    def test_lagging_replicas_skipped_and_probes_cached(self):
+        self.request()
+        self.lags["replica1"] = 30.0
+        self.assertEqual({self.router.db_for_read(CustomUser) for _ in range(20)}, {"replica2"})
+        self.assertEqual(self.probe.call_count, 2)
+
+        routers.lag_monitor.probes.clear()
+        self.lags["replica2"] = float("inf")
+        self.assertEqual(self.router.db_for_read(CustomUser), "default")
+        print(f"---Lagging Replicas Avoided - 🐌🔀✔️")
+
+    def test_outside_requests_use_primary(self):
+        self.assertEqual(self.router.db_for_read(CustomUser), "default")
+        self.assertFalse(self.router.allow_migrate("replica1", "api"))
+        print(f"---Commands Stay On Primary - 🛠️✔️")
+
+
+class AdmissionControlTestCase(TestCase):
+
+    def setUp(self):
+        caches[settings.CREDENTIAL_THROTTLE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+
+    def login(self, email, ip="10.0.0.1", **extra):
+        return self.client.post("/auth/login", {"email": email, "password": "wrong"}, format="json", REMOTE_ADDR=ip, **extra)
+
+    def test_per_email_limit_across_addresses(self):
+        rates = {"credentials_ip": None, "credentials_email": "3/min"}
+        with override_settings(CREDENTIAL_THROTTLE_RATES=rates):
+            codes = [self.login("Target@example.com", ip=f"10.0.0.{i}").status_code for i in range(3)]
+            throttled = self.login("target@example.com", ip="10.0.1.1")
+            other = self.login("other@example.com", ip="10.0.1.1")
+        self.assertEqual(codes, [401, 401, 401])
+        self.assertEqual(throttled.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", throttled)
+        self.assertEqual(throttled.json(), {"status": "Too Many Requests", "message": "Too many attempts, try again later", "statusCode": 429})
+        self.assertEqual(other.status_code, status.HTTP_401_UNAUTHORIZED)
+        print(f"---Per-Email Attempts Limited - 📧🚦✔️")
+
+    def test_per_ip_limit_rejects_without_queries(self):
+        rates = {"credentials_ip": "2/min", "credentials_email": None}
+        with override_settings(CREDENTIAL_THROTTLE_RATES=rates):
+            self.login("a@example.com")
+            self.login("b@example.com")
+            with self.assertNumQueries(0):
+                response = self.login("c@example.com")
+            allowed = self.login("d@example.com", ip="10.0.0.2")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(allowed.status_code, status.HTTP_401_UNAUTHORIZED)
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn('admission_decisions_total{decision="rejected",limiter="credentials_ip"}', body)
+        print(f"---Per-IP Attempts Limited - 🌐🚦✔️")
+
+    def test_client_address_from_trusted_proxies_only(self):
+        rates = {"credentials_ip": "2/min", "credentials_email": None}
+        with override_settings(CREDENTIAL_THROTTLE_RATES=rates):
+            # Without trusted proxies a forged X-Forwarded-For changes nothing
+            codes = [self.login("a@example.com", HTTP_X_FORWARDED_FOR=f"10.9.0.{i}").status_code for i in range(3)]
+            self.assertEqual(codes, [401, 401, 429])
+
+            with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}):
+                # Behind one proxy the client is the address it appended
+                forwarded = [self.login("a@example.com", HTTP_X_FORWARDED_FOR=f"203.0.113.9, 10.9.1.{i}").status_code for i in range(2)]
+        self.assertEqual(forwarded, [401, 401])
+        print(f"---Client IP Taken From Trusted Proxies - 🌐🔁✔️")
+
+    def test_concurrency_cap_sheds_excess(self):
+        limiter = ConcurrencyLimiter("test_concurrency", 1)
+        inside, release = threading.Event(), threading.Event()
+
+        @limiter(lambda: "busy")
+        def view(request):
+            inside.set()
+            release.wait()
+            return "done"
+
+        results = []
+        worker = threading.Thread(target=lambda: results.append(view(None)))
+        worker.start()
+        inside.wait()
+        self.assertEqual(view(None), "busy")
+        release.set()
+        worker.join()
+        self.assertEqual(results, ["done"])
+        self.assertEqual(view(None), "done")
+        print(f"---Concurrency Cap Sheds Load - 🧯✔️")
+
+
+class RefreshTokenTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        data = {"firstName": "John", "lastName": "Doe", "email": "refresh@example.com", "password": "secret"}
+        self.tokens = self.client.post("/auth/register", data, format="json").json()["data"]
+
+    def test_refresh_mints_access_token_without_queries(self):
+        with self.assertNumQueries(0), mock.patch("api.hashing.hashing_pool.check_password") as check_password:
+            response = self.client.post("/auth/token/refresh", {"refreshToken": self.tokens["refreshToken"]}, format="json")
+        check_password.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("refreshToken", response.json()["data"])
+
+        access = tokens.AccessToken(response.json()["data"]["accessToken"])
+        self.assertEqual(access["email"], "refresh@example.com")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(self.client.get("/api/organisations").status_code, status.HTTP_200_OK)
+        print(f"---Access Token Refreshed Without Hashing - 🔄🔑✔️")
+
+    def test_rotation_returns_new_refresh_token(self):
+        with override_settings(SIMPLE_JWT={**settings.SIMPLE_JWT, "ROTATE_REFRESH_TOKENS": True}):
+            response = self.client.post("/auth/token/refresh", {"refreshToken": self.tokens["refreshToken"]}, format="json")
+        rotated = response.json()["data"]["refreshToken"]
+        self.assertNotEqual(tokens.RefreshToken(rotated)["jti"], tokens.RefreshToken(self.tokens["refreshToken"])["jti"])
+        print(f"---Refresh Token Rotated - 🔁✔️")
+
+    def test_invalid_refresh_tokens_rejected(self):
+        for body in ({}, {"refreshToken": "garbage"}, {"refreshToken": self.tokens["accessToken"]}):
+            response = self.client.post("/auth/token/refresh", body, format="json")
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # A refresh token is not a bearer credential
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['refreshToken']}")
+        self.assertEqual(self.client.get("/api/organisations").status_code, status.HTTP_401_UNAUTHORIZED)
+        print(f"---Invalid Refresh Tokens Rejected - 🚫🔄✔️")
+
+
+class RevocationTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        data = {"firstName": "John", "lastName": "Doe", "email": "revoke@example.com", "password": "secret"}
+        self.tokens = self.client.post("/auth/register", data, format="json").json()["data"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['accessToken']}")
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get("/api/organisations").status_code, status.HTTP_200_OK)
+        response = self.client.post("/auth/logout", {"refreshToken": self.tokens["refreshToken"]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.client.get("/api/organisations").status_code, status.HTTP_401_UNAUTHORIZED)
+        refreshed = self.client.post("/auth/token/refresh", {"refreshToken": self.tokens["refreshToken"]}, format="json")
+        self.assertEqual(refreshed.status_code, status.HTTP_401_UNAUTHORIZED)
+        print(f"---Logout Revokes Tokens - 🚪🔒✔️")
+
+    def test_other_workers_pick_up_revocations(self):
+        worker = RevocationList()
+        worker.maybe_sync()
+        self.client.post("/auth/logout", format="json")
+        jti = tokens.AccessToken(self.tokens["accessToken"])["jti"]
+        self.assertFalse(worker.is_revoked(jti))
+
+        with override_settings(REVOCATION_SYNC_INTERVAL=0):
+            self.assertTrue(worker.is_revoked(jti))
+        with self.assertNumQueries(0):
+            self.assertFalse(worker.is_revoked(uuid.uuid4().hex))
+        print(f"---Revocations Synced Across Workers - 🔄🔒✔️")
+
+    def test_expired_entries_pruned_on_rebuild(self):
+        RevokedToken.objects.create(jti="expired", expiresAt=datetime.now(timezone.utc) - timedelta(seconds=1))
+        RevokedToken.objects.create(jti="active", expiresAt=datetime.now(timezone.utc) + timedelta(hours=1))
+        worker = RevocationList()
+        worker.maybe_sync()
+        self.assertEqual(list(RevokedToken.objects.values_list("jti", flat=True)), ["active"])
+        self.assertTrue(worker.is_revoked("active"))
+        self.assertFalse(worker.is_revoked("expired"))
+        print(f"---Expired Revocations Pruned - 🧹✔️")
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        items = [uuid.uuid4().hex for _ in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+        false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+        self.assertLess(false_positives, 300)
+        print(f"---Bloom Filter Sound - 🌸✔️")
+
+
+class UUID7TestCase(TestCase):
+
+    def test_keys_are_version_7_and_time_ordered(self):
+        keys = [uuid7() for _ in range(10000)]
+        self.assertEqual({key.version for key in keys}, {7})
+        self.assertEqual({key.variant for key in keys}, {uuid.RFC_4122})
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(keys)), len(keys))
+        self.assertAlmostEqual(keys[0].int >> 80, time.time() * 1000, delta=5000)
+        print(f"---UUIDv7 Keys Ordered - 🕒✔️")
+
+    def test_new_rows_get_uuid7_keys(self):
+        client = APIClient()
+        data = {"firstName": "John", "lastName": "Doe", "email": "uuid7@example.com", "password": "secret"}
+        user = client.post("/auth/register", data, format="json").json()["data"]["user"]
+        self.assertEqual(uuid.UUID(user["userId"]).version, 7)
+        self.assertEqual(Organisation.objects.get(owner_id=user["userId"]).orgId.version, 7)
+        print(f"---New Rows Use UUIDv7 - 🆕🕒✔️")
+
+
+#Query plans of the hot endpoints on a seeded dataset
+class QueryPlanTestCase(TestCase):
+    # Runs each endpoint with cold caches, EXPLAINs every SELECT it issued and
+    # fails if any of them reads a whole api_ table. Postgres would pick a
+    # sequential scan on tables this small anyway, so there seq scans are
+    # disabled for the EXPLAIN: one that remains means no index can serve it.
+
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password("secret")
+        cls.users = CustomUser.objects.bulk_create([
+            CustomUser(firstName=f"User{i}", lastName="Seeded", email=f"user{i}@example.com", password=password)
+            for i in range(300)
+        ])
+        cls.orgs = Organisation.objects.bulk_create([
+            Organisation(owner=cls.users[i], name=f"Org {i}", description="Seeded") for i in range(100)
+        ])
+        Membership.objects.bulk_create(
+            [Membership(user=cls.users[i], organisation=org, role=Membership.OWNER) for i, org in enumerate(cls.orgs)]
+            + [Membership(user=user, organisation=cls.orgs[i % 100]) for i, user in enumerate(cls.users[100:])]
+        )
+        organisation_search.index(cls.orgs, created=True)
+        cls.user = cls.users[0]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens.AccessToken.for_user(self.user)}")
+
+    def explain(self, sql, params) -> list:
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute("EXPLAIN " + sql, params)
+                return [row[0] for row in cursor.fetchall()]
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def table_scans(self, plan) -> list:
+        if connection.vendor == "postgresql":
+            return [line for line in plan if "Seq Scan on api_" in line]
+        return [line for line in plan if line.startswith("SCAN ") and not line.startswith("SCAN CONSTANT")]
+
+    def assertIndexed(self, request):
+        # request: a callable issuing one API request; returns the SELECTs it ran
+        selects = []
+
+        def capture(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith("SELECT") and "api_" in sql:
+                selects.append((sql, params))
+            return execute(sql, params, many, context)
+
+        for cache in caches.all():
+            cache.clear()
+        with connection.execute_wrapper(capture):
+            request()
+        self.assertTrue(selects, "endpoint ran no queries against api_ tables")
+        for sql, params in selects:
+            plan = self.explain(sql, params)
+            self.assertEqual(self.table_scans(plan), [], "\n".join([sql, *plan]))
+        return selects
+
+    def test_auth_queries_use_indexes(self):
+        self.assertIndexed(lambda: self.client.post("/auth/login", {"email": "USER5@Example.com", "password": "secret"}, format="json"))
+        self.assertIndexed(lambda: self.client.post("/auth/login", {"email": "nobody@example.com", "password": "secret"}, format="json"))
+        data = {"firstName": "John", "lastName": "Doe", "email": "User7@example.COM", "password": "secret"}
+        self.assertIndexed(lambda: self.client.post("/auth/register", data, format="json"))
+        print(f"---Auth Queries Indexed - 🔎✔️")
+
+    def test_organisation_queries_use_indexes(self):
+        org = self.orgs[0]
+        self.assertIndexed(lambda: self.client.get("/api/organisations"))
+        self.assertIndexed(lambda: self.client.get(f"/api/organisations/{org.orgId}"))
+        self.assertIndexed(lambda: self.client.get(f"/api/users/{self.users[100].userId}"))
+        emails = {"emails": ["USER250@example.com", "user251@example.com"]}
+        self.assertIndexed(lambda: self.client.post(f"/api/organisations/{org.orgId}/users", emails, format="json"))
+        self.assertIndexed(lambda: self.client.get("/api/organisations/search", {"q": "org seed"}))
+        print(f"---Organisation Queries Indexed - 🔎🏢✔️")
+
+    def test_revoked_token_check_uses_index(self):
+        token = tokens.AccessToken.for_user(self.user)
+        revocation_list.revoke(token)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertIndexed(lambda: self.client.get("/api/organisations"))
+        print(f"---Revocation Check Indexed - 🔎🔒✔️")
+
+
+class CaseInsensitiveEmailTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        data = {"firstName": "John", "lastName": "Doe", "email": "John.Doe@Example.com", "password": "secret"}
+        self.client.post("/auth/register", data, format="json")
+
+    def test_login_ignores_email_case(self):
+        response = self.client.post("/auth/login", {"email": "john.doe@example.COM", "password": "secret"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["data"]["user"]["email"], "John.Doe@Example.com")
+        print(f"---Login Ignores Email Case - 🔠✔️")
+
+    def test_email_unique_regardless_of_case(self):
+        data = {"firstName": "Jane", "lastName": "Doe", "email": "JOHN.DOE@example.com", "password": "secret"}
+        response = self.client.post("/auth/register", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(response.json()["errors"][0], {"field": "email", "message": "Already Exists"})
+        self.assertEqual(CustomUser.objects.count(), 1)
+        print(f"---Email Unique Regardless Of Case - 🔠🚫✔️")
+
+
+class OrganisationSearchTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(email="search@example.com", password="secret", firstName="Search", lastName="User")
+        self.stranger = CustomUser.objects.create_user(email="stranger@example.com", password="secret", firstName="Other", lastName="User")
+        self.described = Organisation.objects.create(owner=self.user, name="Acme Holdings", description="Rocket skates and anvils")
+        self.named = Organisation.objects.create(owner=self.user, name="Rocket Labs", description="Launch services")
+        self.hidden = Organisation.objects.create(owner=self.stranger, name="Rocket Works", description="Not shared")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens.AccessToken.for_user(self.user)}")
+
+    def search(self, q, **params):
+        return self.client.get("/api/organisations/search", {"q": q, **params})
+
+    def names(self, response):
+        return [org["name"] for org in response.json()["organisations"]]
+
+    def test_ranks_name_matches_first_within_memberships(self):
+        response = self.search("rocket")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.names(response), ["Rocket Labs", "Acme Holdings"])
+        self.assertEqual(set(response.json()["organisations"][0]), {"orgId", "name", "description"})
+        print(f"---Search Ranked And Scoped - 🔍✔️")
+
+    def test_prefixes_and_every_word_must_match(self):
+        self.assertEqual(self.names(self.search("ROCK")), ["Rocket Labs", "Acme Holdings"])
+        self.assertEqual(self.names(self.search("rocket anvil")), ["Acme Holdings"])
+        self.assertEqual(self.names(self.search("rocket bananas")), [])
+        print(f"---Search Prefixes And Conjunction - 🔍🔠✔️")
+
+    def test_index_follows_updates_and_deletes(self):
+        self.named.name = "Orbital Labs"
+        self.named.save()
+        self.assertEqual(self.names(self.search("orbital")), ["Orbital Labs"])
+        self.assertEqual(self.names(self.search("rocket")), ["Acme Holdings"])
+        self.described.delete()
+        self.assertFalse(OrganisationSearchTerm.objects.filter(organisation_id=self.described.orgId).exists())
+        self.assertEqual(self.names(self.search("rocket")), [])
+        print(f"---Search Index Follows Changes - 🔍🔄✔️")
+
+    def test_paginates_without_count(self):
+        for i in range(5):
+            Organisation.objects.create(owner=self.user, name=f"Widget {i}", description="")
+        with self.assertNumQueries(2):
+            first = self.search("widget", limit=3).json()
+        self.assertEqual(len(first["organisations"]), 3)
+        self.assertIsNone(first["previous"])
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(len(second["organisations"]), 2)
+        self.assertIsNone(second["next"])
+        orgIds = [org["orgId"] for org in first["organisations"] + second["organisations"]]
+        self.assertEqual(len(set(orgIds)), 5)
+        print(f"---Search Paginated - 🔍📄✔️")
+
+    def test_bulk_imported_organisations_are_searchable(self):
+        import_users(parse_rows("firstName,lastName,email,password\nZelda,Hyrule,zelda@example.com,secret\n", "csv"))
+        zelda = CustomUser.objects.get(email="zelda@example.com")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens.AccessToken.for_user(zelda)}")
+        self.assertEqual(self.names(self.search("zelda")), ["Zelda's Organisation"])
+        print(f"---Bulk Imports Searchable - 🔍📦✔️")
+
+    def test_rejects_missing_or_long_queries(self):
+        self.assertEqual(self.client.get("/api/organisations/search").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.search("x" * 201).status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.credentials()
+        self.assertEqual(self.search("rocket").status_code, status.HTTP_401_UNAUTHORIZED)
+        print(f"---Search Rejects Bad Queries - 🔍🚫✔️")
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Postgres full-text and trigram search")
+class PostgresSearchTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="search@example.com", password="secret", firstName="Search", lastName="User")
+        stranger = CustomUser.objects.create_user(email="stranger@example.com", password="secret", firstName="Other", lastName="User")
+        Organisation.objects.create(owner=self.user, name="Acme Holdings", description="Rocket skates and anvils")
+        Organisation.objects.create(owner=self.user, name="Rocket Labs", description="Launch services")
+        Organisation.objects.create(owner=stranger, name="Rocket Works", description="Not shared")
+
+    def names(self, text):
+        return [org["name"] for org in organisation_search.search(self.user, text)]
+
+    def test_full_text_and_typos_within_memberships(self):
+        self.assertIsInstance(organisation_search.backend, PostgresSearch)
+        self.assertEqual(self.names("rocket"), ["Rocket Labs", "Acme Holdings"])
+        self.assertEqual(self.names("skates anvils"), ["Acme Holdings"])
+        self.assertEqual(self.names("Rockett Labs"), ["Rocket Labs"])
+        self.assertFalse(OrganisationSearchTerm.objects.exists())
+        print(f"---Postgres Search Ranked And Scoped - 🐘🔍✔️")
+
+    def test_filters_use_the_gin_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = organisation_search.backend.matching(Organisation.objects.all(), "rocket").explain()
+        self.assertIn("organisation_search_vector_idx", plan)
+        self.assertIn("organisation_name_trgm_idx", plan)
+        print(f"---Postgres Search Uses GIN Indexes - 🐘📇✔️")
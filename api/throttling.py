@@ -0,0 +1,77 @@
+import threading
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
+from .metrics import registry
+
+
+#Sliding-window limits for the credential endpoints
+class CredentialThrottle(SimpleRateThrottle):
+    # Request history lives in the CREDENTIAL_THROTTLE_CACHE_ALIAS cache
+    # (locmem per process by default; point it at a shared backend to limit
+    # across workers). Rates come from CREDENTIAL_THROTTLE_RATES at request
+    # time, and every decision is counted in the metrics registry.
+    def __init__(self):
+        self.cache = caches[settings.CREDENTIAL_THROTTLE_CACHE_ALIAS]
+        super().__init__()
+
+    def get_rate(self):
+        return settings.CREDENTIAL_THROTTLE_RATES.get(self.scope)
+
+    def allow_request(self, request, view):
+        allowed = super().allow_request(request, view)
+        if self.rate is not None and self.key is not None:
+            registry.inc("admission_decisions_total", {"limiter": self.scope, "decision": "allowed" if allowed else "rejected"})
+        return allowed
+
+
+class CredentialIPThrottle(CredentialThrottle):
+    scope = "credentials_ip"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
+
+
+class CredentialEmailThrottle(CredentialThrottle):
+    # Caps attempts against one account however many addresses they come from
+    scope = "credentials_email"
+
+    def get_cache_key(self, request, view):
+        email = request.data.get("email")
+        if not isinstance(email, str) or not email:
+            return None
+        return self.cache_format % {"scope": self.scope, "ident": email.strip().lower().encode().hex()}
+
+
+#Process-wide cap on concurrently running credential requests
+class ConcurrencyLimiter:
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    def __call__(self, busy_response):
+        # Decorator: requests past the limit get busy_response() before any DB or hashing work
+        def decorator(view):
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if not self._slots.acquire(blocking=False):
+                    registry.inc("admission_decisions_total", {"limiter": self.name, "decision": "rejected"})
+                    return busy_response()
+                registry.inc("admission_decisions_total", {"limiter": self.name, "decision": "allowed"})
+                with self._lock:
+                    self.in_flight += 1
+                try:
+                    return view(request, *args, **kwargs)
+                finally:
+                    with self._lock:
+                        self.in_flight -= 1
+                    self._slots.release()
+            return wrapper
+        return decorator
+
+
+credential_limiter = ConcurrencyLimiter("credentials_concurrency", settings.CREDENTIAL_CONCURRENCY_LIMIT)
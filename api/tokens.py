@@ -0,0 +1,25 @@
+from django.conf import settings
+from rest_framework_simplejwt import tokens
+
+EMAIL_FIELD = settings.SIMPLE_JWT.get("PAYLOAD_EMAIL_FIELD", "email")
+EMAIL_CLAIM = settings.SIMPLE_JWT.get("PAYLOAD_EMAIL_CLAIM", "email")
+
+
+#Access token that also carries the user's email, so requests can be authenticated without a user lookup
+class AccessToken(tokens.AccessToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[EMAIL_CLAIM] = getattr(user, EMAIL_FIELD)
+        return token
+
+
+#Refresh token carrying the same email claim; the access tokens it mints copy it
+class RefreshToken(tokens.RefreshToken):
+    access_token_class = AccessToken
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[EMAIL_CLAIM] = getattr(user, EMAIL_FIELD)
+        return token
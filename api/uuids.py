@@ -0,0 +1,21 @@
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last = 0
+
+
+def uuid7() -> uuid.UUID:
+    # Time-ordered UUID (RFC 9562 version 7): a 48-bit Unix millisecond
+    # timestamp, then random bits. New keys land at the right edge of B-tree
+    # indexes instead of a random page. rand_a holds a 12-bit counter, so
+    # keys from one process keep increasing within a millisecond; past 4096
+    # in a millisecond the timestamp is borrowed from the next one.
+    global _last
+    with _lock:
+        _last = max(time.time_ns() // 1_000_000 << 12, _last + 1)
+        counter = _last
+    random_bits = int.from_bytes(os.urandom(8), "big") & (1 << 62) - 1
+    return uuid.UUID(int=(counter >> 12) << 80 | 7 << 76 | (counter & 0xFFF) << 64 | 2 << 62 | random_bits)
@@ -0,0 +1,10 @@
+#Shared registration rules for the register view and bulk imports
+REQUIRED_REGISTRATION_FIELDS = ("firstName", "lastName", "email", "password")
+
+
+def reg_form_error(**fields) -> dict:
+    for field in REQUIRED_REGISTRATION_FIELDS:
+        # JSON bodies can carry numbers or objects; the hasher and the email lookups need strings
+        if not fields.get(field) or not isinstance(fields.get(field), str):
+            return {"field": field, "message": "Invalid Input"}
+    return None
@@ -1,11 +1,36 @@
+import ipaddress
+import uuid
 from django.shortcuts import render
 from django.contrib.auth import login, logout, get_user_model
-from rest_framework_simplejwt.tokens import AccessToken
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response 
-from .models import Organisation, CustomUser
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from .bulk import import_users, parse_rows
+from .cache import user_cache, visibility_cache
+from .hashing import hashing_pool
+from .metrics import registry
+from .models import Organisation, CustomUser, Membership
+from .pagination import OrganisationCursorPagination, OrganisationSearchPagination
+from .permissions import HasImportKey
+from .revocation import revocation_list
+from .routers import pin_to_primary
+from .search import organisation_search
+from .throttling import CredentialEmailThrottle, CredentialIPThrottle, credential_limiter
+from .tokens import RefreshToken
+from .validation import reg_form_error
+
+MAX_BATCH_MEMBERS = 1000
+MAX_SEARCH_LENGTH = 200
 
 # Create your views here.
 
@@ -18,8 +43,21 @@ def get_data(request):
     return Response(me)
 
 
+# Load shedding for the hashing endpoints: too many concurrent requests
+def handle_busy_response() -> Response:
+    data = {
+        "status": "Service Unavailable",
+        "message": "Server busy, try again later",
+        "statusCode": 503
+    }
+    return Response(data, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "1"})
+
+
+
 #--------------------------Register User---------------------------------------------
 @api_view(["POST"])
+@throttle_classes([CredentialIPThrottle, CredentialEmailThrottle])
+@credential_limiter(handle_busy_response)
 def register_user(request) -> Response:
     firstName = request.data.get("firstName")
     lastName = request.data.get("lastName")
@@ -33,52 +71,65 @@ def register_user(request) -> Response:
     validation_response = validate_reg_form(firstName=firstName, lastName=lastName, email=email, password=password)
     if validation_response is not None:
         return validation_response
+    # Waits for one of the hashing workers, which cap how many hashes run at once
+    hashed_password = hashing_pool.make_password(password)
+    # One INSERT per row (user, organisation, owner membership) in a single transaction.
+    # The unique email constraint, not a prior exists() check, detects duplicates.
     try:
-        new_user = CustomUser.objects.create(firstName=firstName, lastName=lastName, email=email, phone=phone)
-        userId = new_user.userId
-        user_org=Organisation.objects.create(owner=new_user, name=f"{firstName}'s Organisation", description=f"An Organisation created by {lastName} {firstName}")
-        new_user.set_password(password)  # Hash the password
+        with transaction.atomic():
+            new_user = CustomUser.objects.create(firstName=firstName, lastName=lastName, email=email, phone=phone, password=hashed_password)
+            userId = new_user.userId
+            Organisation.objects.create(owner=new_user, name=f"{firstName}'s Organisation", description=f"An Organisation created by {lastName} {firstName}")
+    except IntegrityError:
+        if CustomUser.objects.filter(email__lower=str(email).lower()).exists():
+            err = handleRegistrationError(field = "email", message="Already Exists")
+            return Response(err, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        return handle_registration_failure()
     except Exception as e:
-        data = {
-            "status": "Bad request",
-            "message": "Registration unsuccessful",
-            "statusCode": 400
-        }
-        return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        return handle_registration_failure()
 
-    user_org.save()
-    new_user.save()
-    access_token = AccessToken.for_user(new_user)
-    access_token = str(access_token)
-    success_json = handleLogRegSuccess(userId=userId,firstName=firstName, lastName=lastName, email=email, registration=True, phone=phone, access_token=access_token )
+    # Not authenticated yet, so the router can't tie this write to the client
+    pin_to_primary(userId)
+    refresh_token = RefreshToken.for_user(new_user)
+    success_json = handleLogRegSuccess(userId=userId,firstName=firstName, lastName=lastName, email=email, registration=True, phone=phone, access_token=str(refresh_token.access_token), refresh_token=str(refresh_token))
     return Response(success_json, status=status.HTTP_201_CREATED)
 
 
 
-# Validate Registration form 
-def validate_reg_form(firstName, lastName, email, password) -> None:
-    if not firstName or firstName == "":
-        err= handleRegistrationError(field = "firstName", message="Invalid Input")
-        return Response(err, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+@api_view(["POST"])
+@authentication_classes([])
+@permission_classes([HasImportKey])
+def bulk_register_users(request) -> Response:
+    format = "csv" if request.content_type.startswith("text/csv") else "ndjson"
+    # Reads the upload line by line as rows are imported, a chunk at a time; request.body
+    # would load it whole and reject imports over DATA_UPLOAD_MAX_MEMORY_SIZE
+    lines = (line.decode("utf-8") for line in iter(request.readline, b""))
+    rows = parse_rows(lines, format)
+    result = import_users(rows, workers=settings.BULK_IMPORT_WORKERS)
+    new_response = handle_successful_response(result, message="Bulk registration complete")
+    return Response(new_response, status=status.HTTP_200_OK)
 
-    if not lastName or lastName == "":
-        err = handleRegistrationError(field = "lastName", message="Invalid Input")
-        return Response(err, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
 
-    if not email or email == "":
-        err = handleRegistrationError(field = "email", message="Invalid Input")
-        return Response(err, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
-    
-    if CustomUser.objects.filter(email=email).exists():
-        err = handleRegistrationError(field = "email", message="Already Exists")
-        return Response(err, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
-    
-    if not password or password == "":
-        err = handleRegistrationError(field = "password", message="Invalid Input")
+
+# Validate Registration form 
+def validate_reg_form(firstName, lastName, email, password) -> None:
+    error = reg_form_error(firstName=firstName, lastName=lastName, email=email, password=password)
+    if error is not None:
+        err = handleRegistrationError(**error)
         return Response(err, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
     return None
+
     
-    
+
+
+
+def handle_registration_failure() -> Response:
+    data = {
+        "status": "Bad request",
+        "message": "Registration unsuccessful",
+        "statusCode": 400
+    }
+    return Response(data, status=status.HTTP_400_BAD_REQUEST)
 
 
 
@@ -90,49 +141,36 @@ def handleRegistrationError(**kwargs)->dict:
 
 
 
-def handleLogRegSuccess(**kwargs)->dict:
-    reg = kwargs["registration"]
-    userId=kwargs["userId"]
-    firstName=kwargs["firstName"]
-    lastName=kwargs["lastName"]
-    email=kwargs["email"]
-    phone=kwargs["phone"]
-    access_token = kwargs["access_token"]
-
-    message = "Login successful"
-    if reg:
-        message ="Registration successful"
-
-    data = {
+def handleLogRegSuccess(userId, firstName, lastName, email, phone, access_token, refresh_token, registration)->dict:
+    return {
         "status": "success",
-        "message": message,
+        "message": "Registration successful" if registration else "Login successful",
         "data": {
-        "accessToken": access_token,
-        "user": {
-            "userId": userId,
-            "firstName": firstName,
-                    "lastName": lastName,
-                    "email": email,
-                    "phone": phone,
-            }
-        }
+            "accessToken": access_token,
+            "refreshToken": refresh_token,
+            "user": {"userId": userId, "firstName": firstName, "lastName": lastName, "email": email, "phone": phone},
+        },
     }
-    return data
 
 
 
 
 #---------------------------LOGIN------------------------------------------------------------
 @api_view(["POST"])
+@throttle_classes([CredentialIPThrottle, CredentialEmailThrottle])
+@credential_limiter(handle_busy_response)
 def login_user(request):
     email=request.data.get("email")
     password=request.data.get("password")
 
     # user = authenticate(request, email, password)
 
+    # No negative caching here: a "not found" cached by one worker would keep
+    # rejecting an account registered through another one
     try:
-        user = CustomUser.objects.get(email = email)
-        if not user.check_password(password):
+        # Credentials are checked against the primary; a replica may not have a brand-new account yet
+        user = CustomUser.objects.using(DEFAULT_DB_ALIAS).get(email__lower=email.lower())
+        if not hashing_pool.check_password(password, user.password):
             user = None
     except:
         user = None
@@ -145,17 +183,18 @@ def login_user(request):
         }
         return Response(error_json, status=status.HTTP_401_UNAUTHORIZED)
 
-    login(request, user)
-    access_token = AccessToken.for_user(user)
-    access_token = str(access_token)
-    success_json = handleLogRegSuccess(userId=user.userId,firstName=user.firstName, lastName=user.lastName, email=email, registration=False, phone=user.phone, access_token =access_token )
+    # The API-only settings profile has no sessions; the bearer token is all a client needs
+    if hasattr(request, "session"):
+        login(request, user)
+    refresh_token = RefreshToken.for_user(user)
+    success_json = handleLogRegSuccess(userId=user.userId,firstName=user.firstName, lastName=user.lastName, email=user.email, registration=False, phone=user.phone, access_token=str(refresh_token.access_token), refresh_token=str(refresh_token))
     return Response(success_json, status=status.HTTP_200_OK)
 
     
 def authenticate(request, email, password):
     userModel = get_user_model()
     try:
-        user = userModel.objects.get(email=email)
+        user = userModel.objects.get(email__lower=email.lower())
     except userModel.DoesNotExist:
         return None
     
@@ -164,6 +203,61 @@ def authenticate(request, email, password):
     return None
 
 
+#---------------------------Token Refresh----------------------------------------------------
+@api_view(["POST"])
+@authentication_classes([])
+def refresh_token(request):
+    # Mints an access token from the refresh token's own claims: no password hash, no user SELECT
+    token = request.data.get("refreshToken")
+    try:
+        # RefreshToken(None) would mint a blank token instead of failing
+        if not isinstance(token, str) or not token:
+            raise TokenError("No refresh token")
+        refresh = RefreshToken(token)
+        if revocation_list.is_revoked(refresh["jti"]):
+            raise TokenError("Token has been revoked")
+    except TokenError:
+        data = {
+            "status": "Bad request",
+            "message": "Invalid or expired refresh token",
+            "statusCode": 401
+        }
+        return Response(data, status=status.HTTP_401_UNAUTHORIZED)
+
+    data = {"accessToken": str(refresh.access_token)}
+    if settings.SIMPLE_JWT.get("ROTATE_REFRESH_TOKENS"):
+        if settings.SIMPLE_JWT.get("BLACKLIST_AFTER_ROTATION"):
+            revocation_list.revoke(refresh)
+        refresh.set_jti()
+        refresh.set_exp()
+        refresh.set_iat()
+        data["refreshToken"] = str(refresh)
+    return Response(handle_successful_response(data, message="Token refreshed"), status=status.HTTP_200_OK)
+
+
+#---------------------------Logout-----------------------------------------------------------
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def logout_user(request):
+    # Revokes the access token used for this request and, if sent, the caller's refresh token
+    revocation_list.revoke(request.auth)
+    token = request.data.get("refreshToken")
+    if isinstance(token, str) and token:
+        try:
+            refresh = RefreshToken(token)
+        except TokenError:
+            refresh = None
+        if refresh is not None and str(refresh.get(api_settings.USER_ID_CLAIM)) == str(request.user.pk):
+            revocation_list.revoke(refresh)
+    if hasattr(request, "session"):
+        logout(request)
+    data = {
+        "status": "success",
+        "message": "Logout successful",
+    }
+    return Response(data, status=status.HTTP_200_OK)
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_user(request, id):
@@ -173,36 +267,44 @@ def get_user(request, id):
             "message": "User not found",
             "statusCode": 404
         }
-    if not CustomUser.objects.filter(userId=id).exists():
-        
+    try:
+        id = uuid.UUID(id)
+    except ValueError:
         return Response(error_data, status=status.HTTP_404_NOT_FOUND)
 
-    lookup_user = CustomUser.objects.get(userId=id)
-
-    
-    U_all_org = Organisation.objects.filter(owner=user) | Organisation.objects.filter(members=user)
-    LU_all_org= Organisation.objects.filter(owner=lookup_user) | Organisation.objects.filter(members=lookup_user)
-    common_organisations = U_all_org & LU_all_org
-    if common_organisations.exists() or id == user.userId:
-        data = {
-            "userId": lookup_user.userId,
-            "firstName": lookup_user.firstName,
-			"lastName": lookup_user.lastName,
-			"email": lookup_user.email,
-			"phone": lookup_user.phone,
-        }
-        user_response = handle_successful_response(data, message="User Found")
-        return Response(user_response)
+    visible = visibility_cache.get(user.pk, id) if visibility_cache.enabled else None
+    if visible:
+        lookup_user = user_cache.get_by_id(id)
+    elif visible is None:
+        lookup_user = CustomUser.objects.visible_to(user, id).values(*user_cache.FIELDS).first()
+        if lookup_user is not None:
+            user_cache.store(lookup_user)
+        if visibility_cache.enabled:
+            visibility_cache.set(user.pk, id, lookup_user is not None)
+    else:
+        lookup_user = None
+
+    if lookup_user is not None:
+        # A matching If-None-Match / If-Modified-Since skips serialization entirely;
+        # with the visibility and user caches warm it skips the database as well
+        updatedAt = lookup_user.pop("updatedAt")
+        not_modified = handle_conditional_request(request, updatedAt)
+        if not_modified is not None:
+            return not_modified
+        user_response = handle_successful_response(lookup_user, message="User Found")
+        return set_validators(Response(user_response), updatedAt)
     return Response(error_data, status=status.HTTP_404_NOT_FOUND)
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_organisation(request, orgId):
     user = request.user
-    user_org = Organisation.objects.get(orgId=orgId)
-    if user in user_org.members.all() or user_org.owner == user:
-        org = user_org
-    else:
+    # Org fetch and membership check in one query, using the (user, organisation) index
+    try:
+        org = Membership.objects.organisations_for(user).filter(orgId=orgId).values("orgId", "name", "description", "updatedAt").first()
+    except ValidationError:
+        org = None
+    if org is None:
         data = {
             "status": "Not Found",
             "message": "Organisation not found",
@@ -210,13 +312,12 @@ def get_organisation(request, orgId):
         }
         return Response(data, status=status.HTTP_404_NOT_FOUND)
 
-    data = {
-        "orgId":org.orgId,
-        "name":org.name,
-        "description": org.description,
-    }
-    new_response = handle_successful_response(data, message="Organisation Retrieved")
-    return Response (new_response, status=status.HTTP_200_OK)
+    updatedAt = org.pop("updatedAt")
+    not_modified = handle_conditional_request(request, updatedAt)
+    if not_modified is not None:
+        return not_modified
+    new_response = handle_successful_response(org, message="Organisation Retrieved")
+    return set_validators(Response(new_response, status=status.HTTP_200_OK), updatedAt)
 
 
 @api_view(["GET", "POST"])
@@ -225,22 +326,15 @@ def get_and_create_org(request):
     user = request.user
 
     if request.method == "GET":
-        all_user_organisations= Organisation.objects.filter(owner=user) | Organisation.objects.filter(members=user)
-        
-        if not all_user_organisations.exists():
+        all_user_organisations= Membership.objects.organisations_for(user).values("orgId", "name", "description")
+        paginator = OrganisationCursorPagination()
+        page = paginator.paginate_queryset(all_user_organisations, request)
+
+        if not page and paginator.cursor is None:
             data =handle_successful_response(message="No Organisation Found")
             return Response(data, status=status.HTTP_204_NO_CONTENT)
-        
-        list=[{}]
-        for org in all_user_organisations:
-            data_to_append={
-                "orgId": org.orgId,
-                "name": org.name,
-                "description": org.description,
-            }
-            list.append(data_to_append)
-        main_data = {"organisations":list}
-        return Response(main_data, status = status.HTTP_200_OK)
+
+        return paginator.get_paginated_response(page)
     
 
     elif request.method == "POST":
@@ -254,8 +348,18 @@ def get_and_create_org(request):
         
         name = request.data.get("name")
         description= request.data.get("description")
-        new_org=Organisation.objects.create(owner=user, name=name, description=description)
-        new_org.save()
+        # request.user comes from the token, not the database. If the account was
+        # deleted since, the owner foreign key fails when the transaction commits
+        try:
+            with transaction.atomic():
+                new_org=Organisation.objects.create(owner=user, name=name, description=description)
+        except IntegrityError:
+            data = {
+                "status": "Bad request",
+                "message": "Authentication failed",
+                "statusCode": 401
+            }
+            return Response(data, status=status.HTTP_401_UNAUTHORIZED)
         data = {
             "orgId": new_org.orgId,
             "name": name,
@@ -265,21 +369,76 @@ def get_and_create_org(request):
         return Response(proper_response, status=status.HTTP_201_CREATED)
         
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def search_organisations(request):
+    # Ranked matches on name and description, among the caller's organisations only
+    text = request.query_params.get("q", "").strip()
+    if not text or len(text) > MAX_SEARCH_LENGTH:
+        data = {
+            "status": "Bad Request",
+            "message": "Client error",
+            "statusCode": 400
+        }
+        return Response(data, status=status.HTTP_400_BAD_REQUEST)
+
+    paginator = OrganisationSearchPagination()
+    page = paginator.paginate_queryset(organisation_search.search(request.user, text), request)
+    return paginator.get_paginated_response(page)
+
+
 def handle_successful_response(data:dict ="", message="") -> dict:
-    new_json={
-        "status": "success",
-        "message": message,
-        "data": data
-    }
-    return new_json
+    return {"status": "success", "message": message, "data": data}
+
+
+# Conditional GET helpers; updatedAt changes on every save, so it versions the payload
+def resource_etag(updatedAt) -> str:
+    return quote_etag(f"{updatedAt.timestamp():.6f}")
+
+
+def handle_conditional_request(request, updatedAt):
+    # Returns a 304 response when the client's copy is current, else None.
+    # Last-Modified only has second granularity while the ETag carries the full
+    # updatedAt, so If-Modified-Since is only looked at when there is no If-None-Match
+    last_modified = None if "HTTP_IF_NONE_MATCH" in request.META else int(updatedAt.timestamp())
+    not_modified = get_conditional_response(request, etag=resource_etag(updatedAt), last_modified=last_modified)
+    if not_modified is not None:
+        # A 304 carries the validators the 200 would have sent (RFC 9110 15.4.5)
+        set_validators(not_modified, updatedAt)
+    return not_modified
+
+
+def set_validators(response, updatedAt) -> HttpResponse:
+    response["ETag"] = resource_etag(updatedAt)
+    response["Last-Modified"] = http_date(updatedAt.timestamp())
+    return response
 
 @api_view(["POST"])
+@permission_classes([IsAuthenticated])
 def add_user_to_org(request, orgId):
-    
+    # Only members of the organisation can add to it. A missing organisation and
+    # one the caller doesn't belong to get the same answer, so neither leaks
+    try:
+        allowed = Membership.objects.filter(user=request.user, organisation_id=orgId).exists()
+    except ValidationError:
+        allowed = False
+    if not allowed:
+        data ={
+            "status": "Bad Request",
+            "message": "Client error",
+            "statusCode": 400
+        }
+        return Response(data, status=status.HTTP_400_BAD_REQUEST)
+
+    if "userIds" in request.data or "emails" in request.data:
+        return add_users_to_org(request, orgId)
+
     try:
         userId = request.data.get("userId")
-        user = CustomUser.objects.get(userId=userId)
-        org = Organisation.objects.get(orgId=orgId)
+        # Asks the database, not the user cache: an account registered through
+        # another worker must be addable straight away
+        if not CustomUser.objects.filter(userId=userId).exists():
+            raise CustomUser.DoesNotExist
     except:
         data ={
             "status": "Bad Request",
@@ -287,10 +446,69 @@ def add_user_to_org(request, orgId):
             "statusCode": 400
         }
         return Response(data, status=status.HTTP_400_BAD_REQUEST)
-    org.members.add(user)
-    org.save()
+    # The membership check above already proved the organisation exists
+    added = Membership.objects.add_members(orgId, [uuid.UUID(str(userId))])
+    visibility_cache.invalidate_users(added)
     data = {
         "status": "success",
         "message": "User added to organisation successfully",
     }
     return Response(data, status=status.HTTP_200_OK)
+
+
+
+def add_users_to_org(request, orgId) -> Response:
+    userIds = request.data.get("userIds") or []
+    emails = request.data.get("emails") or []
+    error_data ={
+        "status": "Bad Request",
+        "message": "Client error",
+        "statusCode": 400
+    }
+    # add_user_to_org has checked the caller's membership, so the organisation exists
+    if not isinstance(userIds, list) or not isinstance(emails, list) or len(userIds) + len(emails) > MAX_BATCH_MEMBERS:
+        return Response(error_data, status=status.HTTP_400_BAD_REQUEST)
+
+    valid_ids = {}
+    for userId in userIds:
+        try:
+            valid_ids[str(userId)] = uuid.UUID(str(userId))
+        except ValueError:
+            pass
+    # Resolve every id and email with a single IN query
+    found = CustomUser.objects.filter(Q(userId__in=valid_ids.values()) | Q(email__lower__in=[e.lower() for e in emails if isinstance(e, str)]))
+    found_ids = set()
+    id_by_email = {}
+    for userId, email in found.values_list("userId", "email"):
+        found_ids.add(userId)
+        id_by_email[email.lower()] = userId
+
+    added = Membership.objects.add_members(orgId, list(found_ids))
+    visibility_cache.invalidate_users(added)
+
+    def result_for(userId):
+        if userId is None or userId not in found_ids:
+            return "not_found"
+        return "added" if userId in added else "already_member"
+
+    results = [{"userId": userId, "status": result_for(valid_ids.get(str(userId)))} for userId in userIds]
+    results += [{"email": email, "status": result_for(id_by_email.get(email.lower() if isinstance(email, str) else None))} for email in emails]
+    new_response = handle_successful_response({"results": results}, message="Users added to organisation")
+    return Response(new_response, status=status.HTTP_200_OK)
+
+
+
+#---------------------------Metrics------------------------------------------------------------
+def metrics(request):
+    # REMOTE_ADDR, not X-Forwarded-For: clients control that header
+    if not metrics_client_allowed(request.META.get("REMOTE_ADDR", "")):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def metrics_client_allowed(address) -> bool:
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_NETWORKS)
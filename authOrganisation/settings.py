@@ -10,13 +10,17 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 import environ
 import dj_database_url
 
 env =environ.Env()
-environ.Env.read_env()
+# Deployments set the environment directly; only parse a .env file when one exists
+ENV_FILE = Path(__file__).resolve().parent / '.env'
+if ENV_FILE.exists():
+    environ.Env.read_env(ENV_FILE)
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -51,13 +55,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.DatabaseRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.TrafficCaptureMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'authOrganisation.urls'
@@ -97,11 +105,46 @@ DATABASES = {
     'default': dj_database_url.config(default=env('DATABASE_URL'))
 }
 
+# Read replicas: DATABASE_REPLICA_URLS is a comma-separated list of database
+# URLs, added as replica1, replica2, ... api.routers.ReplicaRouter sends reads
+# there, except for clients who wrote within REPLICA_PIN_SECONDS and replicas
+# more than REPLICA_MAX_LAG_SECONDS behind (probed every REPLICA_LAG_CHECK_INTERVAL).
+DATABASE_REPLICAS = []
+for index, url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[]), start=1):
+    DATABASES[f'replica{index}'] = {**dj_database_url.parse(url), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{index}')
+DATABASE_ROUTERS = ['api.routers.ReplicaRouter'] if DATABASE_REPLICAS else []
+REPLICA_PIN_SECONDS = env.float('REPLICA_PIN_SECONDS', default=10.0)
+REPLICA_MAX_LAG_SECONDS = env.float('REPLICA_MAX_LAG_SECONDS', default=5.0)
+REPLICA_LAG_CHECK_INTERVAL = env.float('REPLICA_LAG_CHECK_INTERVAL', default=5.0)
+# Pins are written by the worker that took the write and read by whichever worker
+# serves the client next, so with more than one worker process this must name a
+# cache shared between them (Redis or Memcached, added to CACHES below). The
+# locmem default only pins reads within one process.
+REPLICA_PIN_CACHE_ALIAS = env('REPLICA_PIN_CACHE_ALIAS', default='default')
+
+# Postgres connection pooling: with DATABASE_POOL_MAX_SIZE > 0, each process
+# keeps a pool per database (api.db.pool) and requests borrow from it instead
+# of opening a new connection. Warm serverless instances reuse their pool
+# between invocations.
+DATABASE_POOL_MAX_SIZE = env.int('DATABASE_POOL_MAX_SIZE', default=0)
+for alias in ['default', *DATABASE_REPLICAS]:
+    if DATABASE_POOL_MAX_SIZE and DATABASES[alias]['ENGINE'] == 'django.db.backends.postgresql':
+        DATABASES[alias]['ENGINE'] = 'api.db.backends.pooled_postgresql'
+        DATABASES[alias]['CONN_MAX_AGE'] = 0
+        DATABASES[alias]['POOL'] = {
+            'min_size': env.int('DATABASE_POOL_MIN_SIZE', default=0),
+            'max_size': DATABASE_POOL_MAX_SIZE,
+            'timeout': env.float('DATABASE_POOL_TIMEOUT', default=5.0),
+            'idle_timeout': env.float('DATABASE_POOL_IDLE_TIMEOUT', default=300.0),
+        }
+
 # JWT token settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),  
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),    
-    'ROTATE_REFRESH_TOKENS': False,
+    # POST auth/token/refresh also returns a new refresh token when enabled
+    'ROTATE_REFRESH_TOKENS': env.bool('ROTATE_REFRESH_TOKENS', default=False),
     'BLACKLIST_AFTER_ROTATION': True,
     'UPDATE_LAST_LOGIN': False,
 
@@ -121,12 +164,48 @@ SIMPLE_JWT = {
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.TokenUserAuthentication',
         # other authentication classes as needed
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Proxies in front of the app that append to X-Forwarded-For. The throttles
+    # identify clients by the address the outermost trusted proxy saw; with 0 they
+    # use REMOTE_ADDR and ignore the header, which clients can set to anything.
+    # Set it to the real hop count (1 behind a single load balancer), or every
+    # client shares the proxy's address and its limits.
+    'NUM_PROXIES': env.int('NUM_PROXIES', default=0),
+    'EXCEPTION_HANDLER': 'api.exceptions.exception_handler',
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# The "users" cache holds user projections. Locmem is per process (LRU + TTL);
+# point USER_CACHE_BACKEND at a shared backend to share it between workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'users': {
+        'BACKEND': env('USER_CACHE_BACKEND', default='api.cache.CountingLocMemCache'),
+        'LOCATION': env('USER_CACHE_LOCATION', default='users'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+USER_CACHE_ALIAS = 'users'
+
+# Seconds to cache "user A can see user B" decisions in get_user; 0 disables it.
+# Invalidation is per process unless the users cache backend is shared.
+VISIBILITY_CACHE_TIMEOUT = env.int('VISIBILITY_CACHE_TIMEOUT', default=0)
+
+
 AUTH_USER_MODEL = 'api.CustomUser'
 
 # Password validation
@@ -148,6 +227,69 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing runs on PASSWORD_HASHING_WORKERS threads (see api/hashing.py),
+# so at most that many hashes use a core at once; the rest wait their turn.
+PASSWORD_HASHING_WORKERS = env.int('PASSWORD_HASHING_WORKERS', default=4)
+
+
+# Admission control for /auth/register and /auth/login: sliding-window limits per
+# client IP and per email (DRF rate strings, None disables one), kept in the
+# CREDENTIAL_THROTTLE_CACHE_ALIAS cache, plus a per-process cap on how many of
+# these requests run at once; requests past the cap get a 503 before any work.
+CREDENTIAL_THROTTLE_RATES = {
+    'credentials_ip': env('CREDENTIAL_THROTTLE_IP_RATE', default='60/min'),
+    'credentials_email': env('CREDENTIAL_THROTTLE_EMAIL_RATE', default='10/min'),
+}
+CREDENTIAL_THROTTLE_CACHE_ALIAS = env('CREDENTIAL_THROTTLE_CACHE_ALIAS', default='default')
+# The cap also bounds the hashing queue: by default every worker has up to four
+# requests waiting behind it, about four hashes' time at worst
+CREDENTIAL_CONCURRENCY_LIMIT = env.int('CREDENTIAL_CONCURRENCY_LIMIT', default=PASSWORD_HASHING_WORKERS * 5)
+
+# JWT revocation (POST auth/logout): revoked jtis are stored in the RevokedToken
+# table and mirrored in a per-worker Bloom filter, synced every
+# REVOCATION_SYNC_INTERVAL seconds and rebuilt without expired entries every
+# REVOCATION_REBUILD_INTERVAL seconds.
+REVOCATION_SYNC_INTERVAL = env.float('REVOCATION_SYNC_INTERVAL', default=2.0)
+REVOCATION_REBUILD_INTERVAL = env.float('REVOCATION_REBUILD_INTERVAL', default=3600.0)
+REVOCATION_BLOOM_CAPACITY = env.int('REVOCATION_BLOOM_CAPACITY', default=100_000)
+REVOCATION_BLOOM_ERROR_RATE = env.float('REVOCATION_BLOOM_ERROR_RATE', default=0.001)
+
+# Bulk user import (POST auth/register/bulk and manage.py import_users).
+# The endpoint is disabled unless BULK_IMPORT_KEY is set.
+BULK_IMPORT_KEY = env('BULK_IMPORT_KEY', default='')
+BULK_IMPORT_WORKERS = env.int('BULK_IMPORT_WORKERS', default=os.cpu_count() or 1)
+
+
+# Traffic capture: sampled, sanitized request/response pairs appended as JSONL
+# for benchmarks/replay.py. Disabled (and the middleware unloaded) when unset.
+TRAFFIC_CAPTURE_PATH = env('TRAFFIC_CAPTURE_PATH', default='')
+TRAFFIC_CAPTURE_SAMPLE_RATE = env.float('TRAFFIC_CAPTURE_SAMPLE_RATE', default=1.0)
+
+
+# Request metrics exposed at /metrics in Prometheus text format. Under a
+# multi-process server, point METRICS_MULTIPROC_DIR at a directory shared by
+# the workers; each writes its aggregates there every METRICS_FLUSH_INTERVAL
+# seconds and /metrics sums them. A worker removes its file when it exits, and
+# gauges from files not rewritten for 5 intervals are left out.
+METRICS_MULTIPROC_DIR = env('METRICS_MULTIPROC_DIR', default='')
+METRICS_FLUSH_INTERVAL = env.float('METRICS_FLUSH_INTERVAL', default=1.0)
+# /metrics only answers clients whose REMOTE_ADDR falls in these networks
+# (comma-separated CIDRs); add the Prometheus scraper's address here
+METRICS_ALLOWED_NETWORKS = env.list('METRICS_ALLOWED_NETWORKS', default=['127.0.0.1/32', '::1/128'])
+
+
+# Request profiling: samples the stack of PROFILING_SAMPLE_RATE of requests, and
+# of requests sent with a signed X-Profile header when PROFILING_HEADER_ENABLED
+# (mint one with api.profiling.make_trigger_token()). Output goes to
+# PROFILING_OUTPUT_DIR as <name>.folded (flamegraph.pl / speedscope) and
+# <name>.json (time per ORM, hashing, JWT, rendering). Unloaded when both are off.
+PROFILING_SAMPLE_RATE = env.float('PROFILING_SAMPLE_RATE', default=0.0)
+PROFILING_HEADER_ENABLED = env.bool('PROFILING_HEADER_ENABLED', default=False)
+PROFILING_TOKEN_MAX_AGE = env.int('PROFILING_TOKEN_MAX_AGE', default=3600)
+PROFILING_INTERVAL = env.float('PROFILING_INTERVAL', default=0.001)
+PROFILING_OUTPUT_DIR = env('PROFILING_OUTPUT_DIR', default=str(BASE_DIR / 'profiles'))
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
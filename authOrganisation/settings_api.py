@@ -0,0 +1,44 @@
+"""
+API-only settings profile for serverless deployments (authOrganisation/wsgi_api.py).
+
+Same configuration as settings.py, minus everything the JSON API never touches:
+the admin, sessions, messages, staticfiles, template engines, the browsable
+API and translation catalogs. This keeps cold starts down to importing the
+ORM, DRF and the api app.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'rest_framework',
+    'api',
+]
+
+# The api middlewares unload themselves unless configured; /metrics is not
+# scraped per function instance, so request metrics are left out here
+MIDDLEWARE = [
+    'api.middleware.DatabaseRoutingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'api.middleware.TrafficCaptureMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'api.middleware.ProfilingMiddleware',
+]
+
+# Skips the project urls module, which imports the admin site
+ROOT_URLCONF = 'api.urls'
+
+TEMPLATES = []
+
+WSGI_APPLICATION = 'authOrganisation.wsgi_api.application'
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,  # noqa: F405
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+    ),
+}
+
+# All responses are English; avoids loading every app's catalog on first request
+USE_I18N = False
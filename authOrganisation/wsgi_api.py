@@ -0,0 +1,16 @@
+"""
+WSGI entrypoint for the API-only serverless deployment.
+
+Loads authOrganisation.settings_api, which leaves out the admin, sessions,
+templates and static files. vercel.json still deploys wsgi.py: measured with
+benchmarks/cold_start.py, this profile does not yet start faster.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'authOrganisation.settings_api')
+
+application = get_wsgi_application()
+app = application
@@ -0,0 +1,87 @@
+# Cold-start benchmark.
+#
+# Starts a fresh interpreter per run, loads a WSGI entrypoint and sends it one
+# request, for the full settings (authOrganisation/wsgi.py) and the API-only
+# profile (authOrganisation/wsgi_api.py). Reports time to application ready and
+# time to first response, both in-process and as wall time including
+# interpreter startup.
+#
+#   python benchmarks/cold_start.py --runs 20
+#   python benchmarks/cold_start.py --path /api/organisations --importtime 15
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from common import summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRYPOINTS = {"full": "authOrganisation.wsgi", "api": "authOrganisation.wsgi_api"}
+
+CHILD = """
+import io, json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+from importlib import import_module
+application = import_module({module!r}).application
+ready = time.perf_counter()
+environ = {{"REQUEST_METHOD": "GET", "PATH_INFO": {path!r}, "QUERY_STRING": "", "SERVER_NAME": "localhost",
+           "SERVER_PORT": "80", "wsgi.input": io.BytesIO(), "wsgi.url_scheme": "http"}}
+statuses = []
+b"".join(application(environ, lambda status, headers: statuses.append(status)))
+print(json.dumps({{"ready": ready - started, "first_response": time.perf_counter() - started, "status": statuses[0]}}))
+"""
+
+
+def run_once(module, path, importtime=False):
+    args = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", CHILD.format(root=ROOT, module=module, path=path)]
+    started = time.perf_counter()
+    child = subprocess.run(args, cwd=ROOT, capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - started
+    return {**json.loads(child.stdout.strip().splitlines()[-1]), "wall": wall}, child.stderr
+
+
+def slowest_imports(stderr, limit):
+    # Top-level imports by cumulative time, from -X importtime output
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not name.startswith("  "):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for the WSGI entrypoints")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--path", default="/", help="Path of the first request")
+    parser.add_argument("--importtime", type=int, default=0, help="Also list the N slowest top-level imports")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = {}
+    for name, module in ENTRYPOINTS.items():
+        runs = [run_once(module, args.path)[0] for _ in range(args.runs)]
+        results[name] = {
+            "status": runs[0]["status"],
+            **{phase: summarize([run[phase] for run in runs]) for phase in ("ready", "first_response", "wall")},
+        }
+        print(f"{name:5} {module:28} ready p50 {results[name]['ready']['p50_ms']:8.1f}ms  "
+              f"first response p50 {results[name]['first_response']['p50_ms']:8.1f}ms  "
+              f"wall p50 {results[name]['wall']['p50_ms']:8.1f}ms  ({runs[0]['status']})", flush=True)
+        if args.importtime:
+            for cumulative, module_name in slowest_imports(run_once(module, args.path, importtime=True)[1], args.importtime):
+                print(f"      {cumulative / 1000:8.1f}ms  {module_name}")
+
+    full, api = results["full"]["first_response"]["p50_ms"], results["api"]["first_response"]["p50_ms"]
+    print(f"API-only profile: {(1 - api / full) * 100:.0f}% less time to first response")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"path": args.path, "runs": args.runs, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+# Endpoint latency benchmark.
+#
+# Seeds a throwaway test database, drives every route in api/urls.py in-process
+# and reports p50/p95/p99 latency, throughput and SQL queries per endpoint.
+#
+#   python benchmarks/endpoints.py --scale small --output bench.json
+#   python benchmarks/endpoints.py --scale small --baseline bench.json --metric p95_ms --threshold 0.2
+#
+# Exits with status 1 when any endpoint regresses past the threshold.
+import argparse
+import itertools
+import json
+import platform
+import random
+import sys
+import time
+from common import setup_django, summarize
+
+setup_django()
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from api.models import CustomUser, Organisation, Membership
+from api.search import organisation_search
+from api.tokens import AccessToken, RefreshToken
+
+SCALES = {
+    "tiny": {"users": 1_000, "orgs": 200},
+    "small": {"users": 10_000, "orgs": 2_000},
+    "medium": {"users": 100_000, "orgs": 20_000},
+    "large": {"users": 1_000_000, "orgs": 200_000},
+}
+PASSWORD = "benchmark-password"
+CHUNK = 10_000
+
+
+#----------------------------Seeding--------------------------------------------------
+def seed(users, orgs, memberships_per_user, skew, rng):
+    # Every user owns a default organisation like /auth/register creates; the
+    # extra organisations get members with a Zipf-like skew, so a few of them
+    # have a very large membership and most have a handful.
+    hashed = make_password(PASSWORD)
+    user_ids = []
+    for start in range(0, users, CHUNK):
+        batch = [
+            CustomUser(firstName=f"User{i}", lastName="Bench", email=f"user{i}@bench.example", password=hashed)
+            for i in range(start, min(start + CHUNK, users))
+        ]
+        CustomUser.objects.bulk_create(batch)
+        organisations = [Organisation(owner=user, name=f"{user.firstName}'s Organisation", description="") for user in batch]
+        Organisation.objects.bulk_create(organisations)
+        Membership.objects.bulk_create([
+            Membership(user=user, organisation=org, role=Membership.OWNER) for user, org in zip(batch, organisations)
+        ])
+        organisation_search.index(organisations, created=True)
+        user_ids.extend(user.userId for user in batch)
+
+    shared_orgs = []
+    for start in range(0, orgs, CHUNK):
+        batch = [
+            Organisation(owner_id=rng.choice(user_ids), name=f"Shared Organisation {i}", description="Benchmark organisation")
+            for i in range(start, min(start + CHUNK, orgs))
+        ]
+        Organisation.objects.bulk_create(batch)
+        Membership.objects.bulk_create(
+            [Membership(user_id=org.owner_id, organisation=org, role=Membership.OWNER) for org in batch],
+            ignore_conflicts=True,
+        )
+        organisation_search.index(batch, created=True)
+        shared_orgs.extend(org.orgId for org in batch)
+
+    weights = list(itertools.accumulate(1 / (rank ** skew) for rank in range(1, len(shared_orgs) + 1)))
+    pending = []
+    for user_id in user_ids:
+        for org_id in set(rng.choices(shared_orgs, cum_weights=weights, k=memberships_per_user)):
+            pending.append(Membership(user_id=user_id, organisation_id=org_id))
+        if len(pending) >= CHUNK:
+            Membership.objects.bulk_create(pending, ignore_conflicts=True)
+            pending = []
+    Membership.objects.bulk_create(pending, ignore_conflicts=True)
+    return user_ids, shared_orgs
+
+
+#----------------------------Scenarios------------------------------------------------
+def build_scenarios(user_ids, shared_orgs, rng):
+    # Each scenario maps an iteration number to (method, path, request kwargs)
+    member = CustomUser.objects.get(userId=user_ids[0])
+    member.set_password(PASSWORD)
+    member.save()
+    member_orgs = list(Membership.objects.filter(user=member).values_list("organisation_id", flat=True))
+    # The most popular organisation under the skew; gets the largest membership
+    big_org = shared_orgs[0]
+    Membership.objects.get_or_create(user=member, organisation_id=big_org)
+    colleague = Membership.objects.filter(organisation_id=big_org).exclude(user=member).values_list("user_id", flat=True).first()
+    auth = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(member)}"}
+
+    def register(i):
+        data = {"firstName": "Bench", "lastName": "User", "email": f"register{i}@bench.example", "password": PASSWORD}
+        return "post", "/auth/register", {"data": data, "content_type": "application/json"}
+
+    def bulk_register(i):
+        body = f"firstName,lastName,email,password\nBench,User,bulk{i}@bench.example,{PASSWORD}\n"
+        return "post", "/auth/register/bulk", {"data": body, "content_type": "text/csv", "HTTP_X_IMPORT_KEY": "benchmark"}
+
+    def create_org(i):
+        data = {"name": f"Bench Organisation {i}", "description": "Created by the benchmark"}
+        return "post", "/api/organisations", {"data": data, "content_type": "application/json", **auth}
+
+    def refresh(i):
+        data = {"refreshToken": str(RefreshToken.for_user(member))}
+        return "post", "/auth/token/refresh", {"data": data, "content_type": "application/json"}
+
+    def logout(i):
+        # Logout revokes both tokens, so every request needs a fresh pair
+        token = RefreshToken.for_user(member)
+        data = {"refreshToken": str(token)}
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {token.access_token}"}
+        return "post", "/auth/logout", {"data": data, "content_type": "application/json", **headers}
+
+    def add_member(i):
+        data = {"userId": str(rng.choice(user_ids))}
+        return "post", f"/api/organisations/{rng.choice(member_orgs)}/users", {"data": data, "content_type": "application/json", **auth}
+
+    return {
+        "GET /": lambda i: ("get", "/", {}),
+        "POST /auth/register": register,
+        "POST /auth/register/bulk": bulk_register,
+        "POST /auth/login": lambda i: ("post", "/auth/login", {"data": {"email": member.email, "password": PASSWORD}, "content_type": "application/json"}),
+        "POST /auth/token/refresh": refresh,
+        "POST /auth/logout": logout,
+        "GET /api/users/<id> (self)": lambda i: ("get", f"/api/users/{member.userId}", auth),
+        "GET /api/users/<id> (colleague)": lambda i: ("get", f"/api/users/{colleague}", auth),
+        "GET /api/users/<id> (stranger)": lambda i: ("get", f"/api/users/{rng.choice(user_ids)}", auth),
+        "GET /api/organisations": lambda i: ("get", "/api/organisations", auth),
+        "POST /api/organisations": create_org,
+        "GET /api/organisations/<orgId>": lambda i: ("get", f"/api/organisations/{rng.choice(member_orgs)}", auth),
+        "GET /api/organisations/<orgId> (largest)": lambda i: ("get", f"/api/organisations/{big_org}", auth),
+        "POST /api/organisations/<orgId>/users": add_member,
+        "GET /api/organisations/search": lambda i: ("get", "/api/organisations/search", {"data": {"q": "shared organisation"}, **auth}),
+        "GET /api/organisations/search (prefix)": lambda i: ("get", "/api/organisations/search", {"data": {"q": "sha"}, **auth}),
+        "GET /metrics": lambda i: ("get", "/metrics", {}),
+    }
+
+
+def run(scenarios, requests, warmup):
+    client = Client()
+    results = {}
+    for name, scenario in scenarios.items():
+        for i in range(warmup):
+            method, path, kwargs = scenario(-i - 1)
+            getattr(client, method)(path, **kwargs)
+
+        latencies, queries, statuses = [], 0, {}
+        started = time.perf_counter()
+        for i in range(requests):
+            method, path, kwargs = scenario(i)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = getattr(client, method)(path, **kwargs)
+                latencies.append(time.perf_counter() - start)
+            queries += len(captured)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        results[name] = {
+            **summarize(latencies, time.perf_counter() - started),
+            "queries_per_request": round(queries / requests, 2),
+            "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        }
+        print(f"{name:45} p50 {results[name]['p50_ms']:9.2f}ms  p95 {results[name]['p95_ms']:9.2f}ms  "
+              f"p99 {results[name]['p99_ms']:9.2f}ms  {results[name]['throughput_rps']:9.1f} req/s  "
+              f"{results[name]['queries_per_request']:5.1f} queries", flush=True)
+    return results
+
+
+#----------------------------Regression check-----------------------------------------
+def find_regressions(results, baseline, metric, threshold) -> list:
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if previous is None or metric not in previous or not previous[metric]:
+            continue
+        if current[metric] > previous[metric] * (1 + threshold):
+            regressions.append((name, previous[metric], current[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Endpoint latency benchmark")
+    parser.add_argument("--scale", choices=SCALES, default="tiny")
+    parser.add_argument("--users", type=int, help="Overrides the scale's user count")
+    parser.add_argument("--orgs", type=int, help="Overrides the scale's shared organisation count")
+    parser.add_argument("--memberships-per-user", type=int, default=3)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for organisation popularity")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keepdb", action="store_true", help="Reuse the test database between runs")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Results JSON from an earlier run to compare against")
+    parser.add_argument("--metric", default="p95_ms")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression, 0.2 = 20%%")
+    args = parser.parse_args()
+
+    users = args.users or SCALES[args.scale]["users"]
+    orgs = args.orgs or SCALES[args.scale]["orgs"]
+    rng = random.Random(args.seed)
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=args.keepdb)
+    try:
+        # Every scenario comes from one client and account, so the credential throttles
+        # would turn most login and register requests into 429s; no rates disables them
+        with override_settings(BULK_IMPORT_KEY="benchmark", BULK_IMPORT_WORKERS=1, CREDENTIAL_THROTTLE_RATES={}):
+            started = time.perf_counter()
+            user_ids, shared_orgs = seed(users, orgs, args.memberships_per_user, args.skew, rng)
+            print(f"Seeded {users} users and {orgs} shared organisations in {time.perf_counter() - started:.1f}s", flush=True)
+            results = run(build_scenarios(user_ids, shared_orgs, rng), args.requests, args.warmup)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=args.keepdb)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "users": users,
+            "orgs": orgs,
+            "memberships_per_user": args.memberships_per_user,
+            "skew": args.skew,
+            "requests": args.requests,
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+        },
+        "endpoints": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.metric, args.threshold)
+        for name, previous, current in regressions:
+            print(f"REGRESSION {name}: {args.metric} {previous} -> {current}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
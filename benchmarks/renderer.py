@@ -0,0 +1,64 @@
+# Renderer microbenchmark.
+#
+# Renders an organisation listing (UUID keys, like GET /api/organisations
+# without pagination) with DRF's stdlib JSONRenderer and api.renderers.FastJSONRenderer
+# and reports render time per call. Needs no database.
+#
+#   python benchmarks/renderer.py --orgs 10000 --repeat 50
+import argparse
+import json
+import time
+import uuid
+from common import setup_django, summarize
+
+setup_django()
+
+from rest_framework.renderers import JSONRenderer
+from api.renderers import FastJSONRenderer, orjson
+from api.views import handle_successful_response
+
+
+def listing(orgs):
+    organisations = [
+        {"orgId": uuid.uuid4(), "name": f"Organisation {i}", "description": f"Benchmark organisation number {i}"}
+        for i in range(orgs)
+    ]
+    return handle_successful_response({"organisations": organisations}, message="Organisations Retrieved")
+
+
+def measure(renderer, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        renderer.render(data, "application/json")
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON renderer microbenchmark")
+    parser.add_argument("--orgs", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    data = listing(args.orgs)
+    before, after = JSONRenderer(), FastJSONRenderer()
+    if json.loads(before.render(data)) != json.loads(after.render(data)):
+        raise SystemExit("renderers disagree on the output")
+
+    results = {"JSONRenderer": measure(before, data, args.repeat), "FastJSONRenderer": measure(after, data, args.repeat)}
+    for name, stats in results.items():
+        print(f"{name:18} p50 {stats['p50_ms']:8.3f}ms  p95 {stats['p95_ms']:8.3f}ms  mean {stats['mean_ms']:8.3f}ms")
+    if orjson is None:
+        print("orjson is not installed; FastJSONRenderer fell back to JSONRenderer")
+    else:
+        print(f"speedup {results['JSONRenderer']['p50_ms'] / results['FastJSONRenderer']['p50_ms']:.1f}x "
+              f"for {args.orgs} organisations")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"orgs": args.orgs, "repeat": args.repeat, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
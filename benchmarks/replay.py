@@ -0,0 +1,170 @@
+# Traffic replay.
+#
+# Replays a capture written by api.middleware.TrafficCaptureMiddleware against
+# the app in-process (using the configured database), keeping the recorded
+# arrival pattern, and reports latency distributions and response differences.
+#
+#   TRAFFIC_CAPTURE_PATH=traffic.jsonl python manage.py runserver   # record
+#   python benchmarks/replay.py traffic.jsonl --concurrency 8 --speed 10 --password secret
+#
+# --speed compresses time (10 = ten times faster than recorded, 0 = no waiting).
+# Captured passwords are redacted; --password substitutes one for replay. Email
+# addresses are captured as stand-ins, so a login only succeeds when the capture
+# also holds the registration of that account.
+import argparse
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from common import setup_django, summarize
+
+setup_django()
+
+from django.test import Client
+from api.middleware import REDACTED, decode_json
+from api.models import CustomUser
+from api.tokens import AccessToken
+
+UUID_PATTERN = re.compile(r"[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}")
+# Values that legitimately change between the recording and the replay
+VOLATILE_KEYS = {"accessToken", "refreshToken", "userId", "orgId", "next", "previous"}
+
+
+def load(path, limit=None):
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda record: record["ts"])
+    return records[:limit] if limit else records
+
+
+def route_of(record):
+    return f"{record['method']} {UUID_PATTERN.sub('<id>', record['path'])}"
+
+
+def strip_volatile(value):
+    if isinstance(value, dict):
+        return {key: strip_volatile(item) for key, item in value.items() if key not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [strip_volatile(item) for item in value]
+    return value
+
+
+def fill_password(value, password):
+    if isinstance(value, dict):
+        return {key: password if item == REDACTED and "password" in key.lower() else fill_password(item, password)
+                for key, item in value.items()}
+    return value
+
+
+class Replayer:
+    def __init__(self, password=None):
+        self.password = password
+        self.local = threading.local()
+        self.tokens = {}
+        self.tokens_lock = threading.Lock()
+
+    def client(self):
+        if not hasattr(self.local, "client"):
+            self.local.client = Client()
+        return self.local.client
+
+    def auth_header(self, userId):
+        # Captures hold the caller's userId, not its token; mint a fresh one per user
+        with self.tokens_lock:
+            if userId not in self.tokens:
+                user = CustomUser.objects.filter(userId=userId).first()
+                self.tokens[userId] = f"Bearer {AccessToken.for_user(user)}" if user else None
+            return self.tokens[userId]
+
+    def send(self, record):
+        kwargs = {}
+        if record.get("userId"):
+            header = self.auth_header(record["userId"])
+            if header:
+                kwargs["HTTP_AUTHORIZATION"] = header
+        body = record.get("body")
+        if body is not None:
+            if self.password:
+                body = fill_password(body, self.password)
+            kwargs["data"] = json.dumps(body)
+            kwargs["content_type"] = "application/json"
+        path = record["path"] + (f"?{record['query']}" if record.get("query") else "")
+
+        start = time.perf_counter()
+        response = getattr(self.client(), record["method"].lower())(path, **kwargs)
+        elapsed = time.perf_counter() - start
+        return record, response, elapsed
+
+
+def compare(record, response):
+    # Returns a description of the difference, or None when the replay matches
+    if response.status_code != record["status"]:
+        return f"status {record['status']} -> {response.status_code}"
+    replayed = decode_json(response.content, response.get("Content-Type", ""))
+    if strip_volatile(replayed) != strip_volatile(record.get("response")):
+        return "body differs"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured traffic")
+    parser.add_argument("capture", help="JSONL file written by TrafficCaptureMiddleware")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--speed", type=float, default=1.0, help="Time compression factor; 0 sends without waiting")
+    parser.add_argument("--limit", type=int, help="Replay only the first N records")
+    parser.add_argument("--password", help="Password to send where the capture has a redacted one")
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    args = parser.parse_args()
+
+    records = load(args.capture, args.limit)
+    if not records:
+        parser.error("capture is empty")
+    replayer = Replayer(args.password)
+    first_ts = records[0]["ts"]
+
+    futures = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for record in records:
+            if args.speed > 0:
+                delay = (record["ts"] - first_ts) / args.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(executor.submit(replayer.send, record))
+    elapsed = time.perf_counter() - started
+
+    latencies, recorded, diffs = {}, {}, []
+    for future in futures:
+        record, response, latency = future.result()
+        route = route_of(record)
+        latencies.setdefault(route, []).append(latency)
+        recorded.setdefault(route, []).append(record["durationMs"] / 1000)
+        difference = compare(record, response)
+        if difference:
+            diffs.append({"route": route, "path": record["path"], "difference": difference})
+
+    report = {
+        "records": len(records),
+        "elapsed_s": round(elapsed, 3),
+        "overall": summarize([value for values in latencies.values() for value in values], elapsed),
+        "routes": {
+            route: {"replayed": summarize(values), "recorded": summarize(recorded[route])}
+            for route, values in sorted(latencies.items())
+        },
+        "mismatches": len(diffs),
+        "diffs": diffs[:50],
+    }
+    for route, stats in report["routes"].items():
+        print(f"{route:45} replayed p50 {stats['replayed']['p50_ms']:8.2f}ms p95 {stats['replayed']['p95_ms']:8.2f}ms"
+              f" | recorded p50 {stats['recorded']['p50_ms']:8.2f}ms p95 {stats['recorded']['p95_ms']:8.2f}ms")
+    print(f"{len(records)} requests in {elapsed:.2f}s, {len(diffs)} responses differ from the capture")
+    for diff in diffs[:10]:
+        print(f"  {diff['route']}: {diff['difference']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# UUID key benchmark.
+#
+# Inserts rows keyed by uuid4 and by api.uuids.uuid7 into scratch tables on
+# the configured database (DATABASE_URL), the way CustomUser/Organisation
+# store them, and reports insert throughput as the table grows plus the final
+# primary key index size. The scratch tables are dropped afterwards.
+#
+#   python benchmarks/uuid_keys.py --rows 2000000 --batch 10000 --output uuid_keys.json
+import argparse
+import json
+import time
+import uuid
+from common import setup_django
+
+setup_django()
+
+from django.db import connection
+from api.uuids import uuid7
+
+GENERATORS = {"uuid4": uuid.uuid4, "uuid7": uuid7}
+
+
+def create_table(name):
+    # Same key column type Django uses for a UUIDField primary key on this backend
+    key_type = "uuid" if connection.vendor == "postgresql" else "char(32)"
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {name}")
+        cursor.execute(f"CREATE TABLE {name} (id {key_type} NOT NULL PRIMARY KEY, payload varchar(64) NOT NULL)")
+
+
+def drop_table(name):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {name}")
+
+
+def index_bytes(name) -> int:
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(f"SELECT pg_relation_size('{name}_pkey')")
+        elif connection.vendor == "sqlite":
+            cursor.execute(f"SELECT SUM(pgsize) FROM dbstat WHERE name = 'sqlite_autoindex_{name}_1'")
+        else:
+            return 0
+        return int(cursor.fetchone()[0] or 0)
+
+
+def insert(name, generate, rows, batch, report_every):
+    # Keys are generated outside the timed section; only the INSERTs are measured
+    to_db = (lambda key: key) if connection.vendor == "postgresql" else (lambda key: key.hex)
+    sql = f"INSERT INTO {name} (id, payload) VALUES (%s, %s)"
+    # Each checkpoint's rate covers only the rows inserted since the previous one
+    checkpoints, window, inserted, since = [], 0.0, 0, 0
+    while inserted < rows:
+        size = min(batch, rows - inserted)
+        values = [(to_db(generate()), "x" * 64) for _ in range(size)]
+        start = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, values)
+        connection.commit()
+        window += time.perf_counter() - start
+        inserted += size
+        since += size
+        if inserted % report_every == 0 or inserted == rows:
+            checkpoints.append({"rows": inserted, "rows_per_second": round(since / window, 1) if window else 0.0})
+            window, since = 0.0, 0
+    return checkpoints
+
+
+def main():
+    parser = argparse.ArgumentParser(description="uuid4 vs uuid7 primary key insert benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--report-every", type=int, default=250_000, help="Rows per throughput sample")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+    if args.report_every % args.batch:
+        raise SystemExit("--report-every must be a multiple of --batch")
+
+    connection.set_autocommit(False)
+    results = {}
+    for label, generate in GENERATORS.items():
+        name = f"bench_keys_{label}"
+        create_table(name)
+        connection.commit()
+        try:
+            checkpoints = insert(name, generate, args.rows, args.batch, args.report_every)
+            results[label] = {"throughput": checkpoints, "index_bytes": index_bytes(name)}
+        finally:
+            drop_table(name)
+            connection.commit()
+        for point in checkpoints:
+            print(f"{label}  {point['rows']:>10} rows  {point['rows_per_second']:>12,.0f} rows/s")
+        print(f"{label}  primary key index {results[label]['index_bytes'] / 2 ** 20:.1f} MiB")
+
+    v4, v7 = results["uuid4"], results["uuid7"]
+    speedup = v7["throughput"][-1]["rows_per_second"] / v4["throughput"][-1]["rows_per_second"]
+    print(f"{connection.vendor}: uuid7 inserts {speedup:.1f}x as fast as uuid4 at {args.rows} rows")
+    if v4["index_bytes"]:
+        print(f"uuid7 primary key index is {v7['index_bytes'] / v4['index_bytes']:.2f}x the uuid4 one")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"vendor": connection.vendor, "rows": args.rows, "batch": args.batch, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()